@@ -0,0 +1,75 @@
+import threading
+import time
+from bisect import bisect_left
+
+from recipes.models import Ingredient
+
+MAX_AGE = 300
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """Отсортированный по нормализованному названию список ингредиентов.
+
+    Сначала отдаёт совпадения по началу названия, затем по подстроке.
+    Сигналы сбрасывают индекс в текущем процессе, а MAX_AGE ограничивает
+    время жизни индекса в остальных воркерах.
+    """
+
+    def __init__(self, max_age=MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._keys = None
+        self._items = None
+        self._built_at = 0
+
+    def build(self):
+        entries = sorted(
+            (normalize(name), ingredient_id, name, measurement_unit)
+            for ingredient_id, name, measurement_unit
+            in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').iterator()
+        )
+        self._keys = [entry[0] for entry in entries]
+        self._items = [
+            {'id': ingredient_id, 'name': name,
+             'measurement_unit': measurement_unit}
+            for _, ingredient_id, name, measurement_unit in entries
+        ]
+        self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._keys = None
+            self._items = None
+
+    def _ensure_built(self):
+        with self._lock:
+            if (self._keys is None
+                    or time.monotonic() - self._built_at > self.max_age):
+                self.build()
+            return self._keys, self._items
+
+    def search(self, query, limit=None):
+        keys, items = self._ensure_built()
+        query = normalize(query)
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        result = items[start:end]
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+        for position, key in enumerate(keys):
+            if start <= position < end or query not in key:
+                continue
+            result.append(items[position])
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,93 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow, User
+
+# Сколько последних рецептов подписок кладётся в ленту при её сборке.
+# Более старые рецепты в хранимой ленте есть только те, что добавил
+# fan_out, поэтому глубже FEED_SIZE она короче ленты по join
+FEED_SIZE = 1000
+CHUNK_SIZE = 1000
+
+
+def needs_feed(user_id):
+    """Ленту пользователя стоит хранить: подписок не меньше порога"""
+    threshold = settings.FEED_FANOUT_MIN_FOLLOWS
+    return bool(threshold) and (
+        Follow.objects.filter(user_id=user_id).count() >= threshold)
+
+
+def is_materialized(user):
+    """Ленту читаем из FeedEntry, только когда build её уже собрала:
+    до этого она пуста или неполна"""
+    return user.feed_materialized and needs_feed(user.id)
+
+
+def feed_recipes(user, materialized=False):
+    """Рецепты ленты: один join по Follow или по FeedEntry"""
+    if materialized:
+        return Recipe.objects.filter(feed_entries__user=user)
+    return Recipe.objects.filter(author__following__user=user)
+
+
+def _bulk_create(entries):
+    entries = iter(entries)
+    total = 0
+    while True:
+        chunk = list(islice(entries, CHUNK_SIZE))
+        if not chunk:
+            return total
+        FeedEntry.objects.bulk_create(chunk, ignore_conflicts=True)
+        total += len(chunk)
+
+
+def materialized_followers(author_id):
+    """Подписчики автора, чья лента хранится в FeedEntry или вот-вот
+    будет собрана"""
+    return Follow.objects.filter(
+        user__in=Follow.objects.filter(
+            following_id=author_id).values('user_id')
+    ).values('user_id').annotate(follows=Count('id')).filter(
+        follows__gte=settings.FEED_FANOUT_MIN_FOLLOWS
+    ).values_list('user_id', flat=True)
+
+
+def fan_out(recipe_id):
+    """Новый рецепт в ленты подписчиков автора"""
+    author_id = Recipe.objects.filter(
+        pk=recipe_id).values_list('author_id', flat=True).first()
+    if author_id is None or not settings.FEED_FANOUT_MIN_FOLLOWS:
+        return 0
+    return _bulk_create(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id)
+        for user_id in materialized_followers(author_id).iterator()
+    )
+
+
+def build(user_id):
+    """Заполняет ленту последними FEED_SIZE рецептами подписок и
+    переключает на неё чтение"""
+    if not needs_feed(user_id):
+        return 0
+    # Флаг и записи ленты становятся видны вместе, при коммите
+    with transaction.atomic():
+        User.objects.filter(pk=user_id).update(feed_materialized=True)
+        return _bulk_create(
+            FeedEntry(user_id=user_id, recipe_id=recipe_id)
+            for recipe_id in feed_recipes(user_id).order_by(
+                '-id').values_list('id', flat=True)[:FEED_SIZE].iterator()
+        )
+
+
+def remove_author(user_id, author_id):
+    """Убирает рецепты автора из ленты после отписки. Если подписок
+    стало меньше порога, fan_out ленту больше не пополняет: она
+    удаляется, и чтение возвращается к join"""
+    if needs_feed(user_id):
+        return FeedEntry.objects.filter(
+            user_id=user_id, recipe__author_id=author_id).delete()[0]
+    User.objects.filter(pk=user_id).update(feed_materialized=False)
+    return FeedEntry.objects.filter(user_id=user_id).delete()[0]
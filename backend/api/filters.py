@@ -1,15 +1,50 @@
 from django_filters import rest_framework as filters
-from recipes.models import Recipe
-from rest_framework.filters import SearchFilter
+from recipes.models import Ingredient, Recipe
+
+from .search import search_recipes
+
+
+class RecipeOrderingFilter(filters.OrderingFilter):
+    """Сортировка по счётчикам; при равных счётчиках новые рецепты
+    первыми, чтобы порядок страниц был устойчивым"""
+
+    def filter(self, qs, value):
+        qs = super().filter(qs, value)
+        if not value:
+            return qs
+        ordering = (*qs.query.order_by, '-id')
+        if qs.query.values_select:
+            # Курсорной пагинации нужны поля сортировки в строках values()
+            qs = qs.values(
+                *qs.query.values_select, *qs.query.annotation_select,
+                *(name.lstrip('-') for name in ordering)
+            )
+        return qs.order_by(*ordering)
 
 
 class RecipeFilter(filters.FilterSet):
-    tags = filters.AllValuesMultipleFilter(
-        field_name='tags__slug', lookup_expr='contains'
+    tags = filters.CharFilter(method='filter_tags')
+    ingredients = filters.ModelMultipleChoiceFilter(
+        queryset=Ingredient.objects.all(),
+        conjoined=True
     )
+    search = filters.CharFilter(method='filter_search')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    # Последним: явная сортировка заменяет сортировку поиска по рангу
+    ordering = RecipeOrderingFilter(
+        fields=('favorites_count', 'cart_count'))
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тэгов. Неизвестный slug, как и
+        раньше, даёт пустой результат, а не 400"""
+        return queryset.filter(
+            tags__slug__in=self.request.query_params.getlist(name)
+        ).distinct()
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
 
     def filter_is_favorited(self, queryset, name, value):
         if value and not self.request.user.is_anonymous:
@@ -24,7 +59,3 @@ class RecipeFilter(filters.FilterSet):
     class Meta:
         model = Recipe
         fields = ['tags', 'author']
-
-
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
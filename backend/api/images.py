@@ -0,0 +1,112 @@
+import base64
+import binascii
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+CHUNK_SIZE = 64 * 1024
+IMAGE_FORMATS = {'png', 'jpeg', 'jpg', 'gif', 'webp'}
+THUMBNAIL_DIR = 'recipes/thumbnails'
+THUMBNAIL_SIZES = {'grid': 480, 'mini': 160}
+THUMBNAIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+def decode_data_uri(data, max_size=None):
+    """Декодирует data:image/...;base64 по частям во временный файл на
+    диске с именем по хэшу содержимого, не превышая max_size байт"""
+    max_size = max_size or settings.RECIPE_IMAGE_MAX_SIZE
+    start = data.find(';base64,', 0, 64)
+    if start == -1:
+        raise ValidationError('Картинка должна быть в формате base64')
+    ext = data[len('data:image/'):start].lower()
+    if ext not in IMAGE_FORMATS:
+        raise ValidationError(f'Формат {ext} не поддерживается')
+    start += len(';base64,')
+    if (len(data) - start) // 4 * 3 > max_size + 2:
+        raise ValidationError(
+            f'Картинка не должна быть больше {max_size} байт'
+        )
+
+    digest = hashlib.sha256()
+    output = TemporaryUploadedFile(f'upload.{ext}', f'image/{ext}', 0, None)
+    size = 0
+    for offset in range(start, len(data), CHUNK_SIZE):
+        try:
+            chunk = base64.b64decode(
+                data[offset:offset + CHUNK_SIZE], validate=True)
+        except (binascii.Error, ValueError):
+            output.close()
+            raise ValidationError('Картинка должна быть в формате base64')
+        size += len(chunk)
+        if size > max_size:
+            output.close()
+            raise ValidationError(
+                f'Картинка не должна быть больше {max_size} байт'
+            )
+        digest.update(chunk)
+        output.write(chunk)
+    output.seek(0)
+    output.size = size
+    output.name = f'{digest.hexdigest()[:32]}.{ext}'
+    output.content_hashed = True
+    return output
+
+
+def thumbnail_name(name, size, fmt):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{THUMBNAIL_DIR}/{stem}_{THUMBNAIL_SIZES[size]}.{fmt}'
+
+
+def thumbnail_urls(name, ready, storage=default_storage):
+    """Ссылки на уменьшенные копии картинки по размерам и форматам,
+    None, пока копии не готовы"""
+    if not ready:
+        return None
+    return {
+        size: {
+            fmt: storage.url(thumbnail_name(name, size, fmt))
+            for fmt in THUMBNAIL_FORMATS
+        }
+        for size in THUMBNAIL_SIZES
+    }
+
+
+def thumbnail_url(name, size, ready, fmt='jpeg', storage=default_storage):
+    """Уменьшенная копия, пока её нет — исходная картинка"""
+    if not ready:
+        return storage.url(name)
+    return storage.url(thumbnail_name(name, size, fmt))
+
+
+def make_thumbnails(name, storage=default_storage):
+    """Создаёт недостающие уменьшенные копии картинки, возвращает их
+    количество"""
+    missing = [
+        (size, fmt) for size in THUMBNAIL_SIZES for fmt in THUMBNAIL_FORMATS
+        if not storage.exists(thumbnail_name(name, size, fmt))
+    ]
+    if not missing:
+        return 0
+    with storage.open(name) as source:
+        image = Image.open(source)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info
+                              else 'RGB')
+    for size, fmt in missing:
+        thumbnail = image.copy()
+        thumbnail.thumbnail((THUMBNAIL_SIZES[size], THUMBNAIL_SIZES[size]))
+        if fmt == 'jpeg' and thumbnail.mode != 'RGB':
+            thumbnail = thumbnail.convert('RGB')
+        content = BytesIO()
+        thumbnail.save(content, THUMBNAIL_FORMATS[fmt], quality=80)
+        storage.save(thumbnail_name(name, size, fmt),
+                     ContentFile(content.getvalue()))
+    return len(missing)
@@ -0,0 +1,45 @@
+import random
+import time
+
+from api.autocomplete import ingredient_index
+from django.core.management.base import BaseCommand
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = 'Compares ingredient autocomplete index with the database search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=50)
+
+    def measure(self, search, queries):
+        started = time.perf_counter()
+        for query in queries:
+            search(query)
+        return (time.perf_counter() - started) / len(queries) * 1000
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            self.stderr.write('No ingredients, run import_ingredients first')
+            return
+        queries = [
+            name[:random.randint(1, 4)]
+            for name in random.choices(names, k=options['queries'])
+        ]
+        limit = options['limit']
+        ingredient_index.build()
+        database = self.measure(
+            lambda query: list(Ingredient.objects.filter(
+                name__istartswith=query
+            ).values('id', 'name', 'measurement_unit')),
+            queries
+        )
+        index = self.measure(
+            lambda query: ingredient_index.search(query, limit), queries
+        )
+        self.stdout.write(
+            f'{len(names)} ingredients, {len(queries)} queries: '
+            f'database {database:.3f} ms, index {index:.3f} ms per query'
+        )
@@ -0,0 +1,44 @@
+import io
+import time
+import tracemalloc
+
+from api.shopping_list import register_font, render_pdf
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Measures shopping list PDF render time and peak memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[10, 1000, 10000]
+        )
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        register_font()
+        for size in options['sizes']:
+            ingredients = [
+                {
+                    'ingredient__name': f'ингредиент {number}',
+                    'ingredient__measurement_unit': 'г',
+                    'total': number,
+                }
+                for number in range(size)
+            ]
+            best = None
+            for _ in range(options['repeat']):
+                stream = io.BytesIO()
+                tracemalloc.start()
+                started = time.perf_counter()
+                render_pdf(iter(ingredients), stream)
+                elapsed = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, peak, stream.tell())
+            elapsed, peak, size_bytes = best
+            self.stdout.write(
+                f'{size} lines: {elapsed * 1000:.1f} ms, '
+                f'peak {peak / 1024:.0f} KiB, pdf {size_bytes / 1024:.0f} KiB'
+            )
@@ -0,0 +1,25 @@
+from api import feeds
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    help = ('Fills materialized feeds of users who follow at least '
+            'FEED_FANOUT_MIN_FOLLOWS authors')
+
+    def handle(self, *args, **options):
+        threshold = settings.FEED_FANOUT_MIN_FOLLOWS
+        if not threshold:
+            raise CommandError(
+                'FEED_FANOUT_MIN_FOLLOWS не задан, ленты читаются '
+                'из подписок напрямую')
+        users = Follow.objects.values('user_id').annotate(
+            follows=Count('id')).filter(
+            follows__gte=threshold).values_list('user_id', flat=True)
+        built = entries = 0
+        for user_id in users.iterator():
+            entries += feeds.build(user_id)
+            built += 1
+        self.stdout.write(f'{built} feed(s) built, {entries} entries')
@@ -0,0 +1,20 @@
+import time
+
+from api import similarity
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Builds the recipe x ingredient/tag matrix for similar recipe '
+            'recommendations and writes it to SIMILARITY_DIR')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        ids, matrix = similarity.build()
+        size = (ids.nbytes + matrix.indptr.size * 4 + matrix.indices.size * 4
+                + matrix.data.size * 4)
+        self.stdout.write(
+            f'{len(ids)} recipe(s), {matrix.shape[1]} feature column(s), '
+            f'{matrix.nnz} non-zero(s), {size / 1024:.0f} KiB in '
+            f'{settings.SIMILARITY_DIR}, {time.monotonic() - start:.1f}s')
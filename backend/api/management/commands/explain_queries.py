@@ -0,0 +1,77 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from recipes.models import IngredientRecipe, Recipe, Tag
+from users.models import Follow, User
+
+SEQUENTIAL_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+class Command(BaseCommand):
+    help = ('Runs EXPLAIN on the main API queries and reports sequential '
+            'scans (checked on PostgreSQL only)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int,
+            help='id пользователя, от имени которого строятся запросы'
+        )
+        parser.add_argument(
+            '--no-seqscan', action='store_true',
+            help='SET enable_seqscan = off, чтобы на маленькой базе '
+                 'PostgreSQL выбирал индекс, если он вообще применим'
+        )
+        parser.add_argument(
+            '--fail-on-seqscan', action='store_true',
+            help='Завершиться с ошибкой, если найден Seq Scan'
+        )
+
+    def get_queries(self, user):
+        slugs = list(Tag.objects.values_list('slug', flat=True)[:2]) or [
+            'breakfast']
+        return {
+            'recipes list': Recipe.objects.for_user(user)[:10],
+            'recipes by author': Recipe.objects.for_user(user).filter(
+                author=user)[:10],
+            'recipes by tags': Recipe.objects.for_user(user).filter(
+                tags__slug__in=slugs).distinct()[:10],
+            'recipes is_favorited': Recipe.objects.for_user(
+                user).favorite(user)[:10],
+            'recipes is_in_shopping_cart': Recipe.objects.for_user(
+                user).cart(user)[:10],
+            'recipe ingredients': IngredientRecipe.objects.filter(
+                recipe_id__in=[1, 2, 3]).select_related('ingredient'),
+            'shopping list': IngredientRecipe.objects.shopping_list(user),
+            'subscriptions': Follow.objects.filter(
+                user=user).with_following().order_by('id')[:10],
+        }
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.get(id=options['user'])
+        else:
+            user = User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError('Нет ни одного пользователя')
+        postgresql = connection.vendor == 'postgresql'
+        if options['no_seqscan'] and postgresql:
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+        scans = []
+        for name, queryset in self.get_queries(user).items():
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            if postgresql:
+                for table in SEQUENTIAL_SCAN.findall(plan):
+                    scans.append(f'{name}: {table}')
+
+        if scans:
+            self.stdout.write(self.style.WARNING(
+                'Sequential scans:\n' + '\n'.join(scans)))
+            if options['fail_on_seqscan']:
+                raise CommandError(f'{len(scans)} sequential scan(s) found')
+        else:
+            self.stdout.write(self.style.SUCCESS('No sequential scans'))
@@ -0,0 +1,165 @@
+import http.client
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import Recipe, Tag
+from rest_framework.authtoken.models import Token
+
+# Сценарий и его вес в общей смеси запросов
+MIX = {
+    'recipes list': 30,
+    'recipes by tags': 10,
+    'recipes by author': 5,
+    'recipes favorited': 5,
+    'recipe detail': 15,
+    'favorite': 10,
+    'cart': 10,
+    'subscriptions': 10,
+    'download cart': 5,
+}
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, len(values) * p // 100)]
+
+
+class Client:
+    """Keep-alive соединение одного виртуального пользователя"""
+
+    def __init__(self, url, token):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.headers = {'Authorization': f'Token {token}'}
+        self.connection = None
+
+    def request(self, method, path):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=30)
+        try:
+            self.connection.request(method, path, headers=self.headers)
+            response = self.connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            return 0
+
+
+class Command(BaseCommand):
+    help = ('Replays a mix of recipe, favorite, cart and subscription '
+            'requests against a running server and reports latency '
+            'percentiles and throughput per endpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--prefix', default='load',
+            help='Префикс пользователей, созданных seed_load')
+        parser.add_argument(
+            '--only', default='',
+            help='Сценарии через запятую, по умолчанию все')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        tokens = list(Token.objects.filter(
+            user__username__startswith=options['prefix']
+        ).values_list('key', flat=True)[:10000])
+        if not tokens:
+            raise CommandError(
+                'Нет пользователей с токенами, сначала запустите seed_load')
+        mix = MIX
+        if options['only']:
+            names = options['only'].split(',')
+            unknown = set(names).difference(MIX)
+            if unknown:
+                raise CommandError(f'Неизвестные сценарии: {unknown}')
+            mix = {name: MIX[name] for name in names}
+        self.recipes = list(Recipe.objects.values_list('id', flat=True))
+        self.authors = list(Recipe.objects.order_by().values_list(
+            'author_id', flat=True).distinct()[:1000])
+        self.tags = list(Tag.objects.values_list('slug', flat=True))
+
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+        rng = random.Random(options['seed'])
+        threads = [
+            threading.Thread(target=self.worker, args=(
+                Client(options['url'], rng.choice(tokens)), mix, deadline,
+                random.Random(rng.random())))
+            for _ in range(options['concurrency'])
+        ]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.print_report(time.monotonic() - start)
+
+    def worker(self, client, mix, deadline, rng):
+        names, weights = list(mix), list(mix.values())
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            for endpoint, method, path in self.scenario(name, rng):
+                start = time.perf_counter()
+                status = client.request(method, path)
+                elapsed = (time.perf_counter() - start) * 1000
+                with self.lock:
+                    self.samples[endpoint].append((elapsed, status))
+
+    def scenario(self, name, rng):
+        """Запросы сценария: (имя в отчёте, метод, адрес)"""
+        recipe = rng.choice(self.recipes)
+        if name == 'recipes list':
+            page = rng.randint(1, 5)
+            return [(name, 'GET', f'/api/recipes/?page={page}&limit=6')]
+        if name == 'recipes by tags':
+            tags = '&'.join(f'tags={slug}' for slug in rng.sample(
+                self.tags, rng.randint(1, len(self.tags))))
+            return [(name, 'GET', f'/api/recipes/?limit=6&{tags}')]
+        if name == 'recipes by author':
+            author = rng.choice(self.authors)
+            return [(name, 'GET', f'/api/recipes/?limit=6&author={author}')]
+        if name == 'recipes favorited':
+            return [(name, 'GET', '/api/recipes/?limit=6&is_favorited=1')]
+        if name == 'recipe detail':
+            return [(name, 'GET', f'/api/recipes/{recipe}/')]
+        if name in ('favorite', 'cart'):
+            action = 'favorite' if name == 'favorite' else 'shopping_cart'
+            path = f'/api/recipes/{recipe}/{action}/'
+            return [(f'{name} add', 'POST', path),
+                    (f'{name} remove', 'DELETE', path)]
+        if name == 'subscriptions':
+            return [(name, 'GET',
+                     '/api/users/subscriptions/?limit=6&recipes_limit=3')]
+        return [(name, 'GET',
+                 '/api/recipes/download_shopping_cart/?format=txt')]
+
+    def print_report(self, elapsed):
+        self.stdout.write(
+            f'{"endpoint":<20} {"count":>7} {"rps":>7} {"p50":>7} '
+            f'{"p95":>7} {"p99":>7} {"max":>7} {"4xx":>5} {"err":>5}')
+        total = 0
+        for endpoint, samples in sorted(self.samples.items()):
+            latencies = sorted(latency for latency, _ in samples)
+            client_errors = sum(400 <= status < 500 for _, status in samples)
+            errors = sum(status == 0 or status >= 500 for _, status in samples)
+            total += len(samples)
+            self.stdout.write(
+                f'{endpoint:<20} {len(samples):>7} '
+                f'{len(samples) / elapsed:>7.1f} '
+                f'{percentile(latencies, 50):>7.1f} '
+                f'{percentile(latencies, 95):>7.1f} '
+                f'{percentile(latencies, 99):>7.1f} '
+                f'{latencies[-1]:>7.1f} {client_errors:>5} {errors:>5}')
+        self.stdout.write(
+            f'{total} requests in {elapsed:.1f}s, {total / elapsed:.1f} rps, '
+            f'latency in ms')
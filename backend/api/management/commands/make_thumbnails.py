@@ -0,0 +1,24 @@
+from api.images import make_thumbnails
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Creates missing WebP and JPEG thumbnails for recipe images'
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        created = failed = 0
+        names = Recipe.objects.order_by().values_list(
+            'image', flat=True).distinct()
+        for name in names.iterator():
+            try:
+                created += make_thumbnails(name, storage)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+                continue
+            Recipe.objects.filter(image=name, thumbnails_ready=False).update(
+                thumbnails_ready=True)
+        self.stdout.write(
+            f'{created} thumbnail(s) created, {failed} image(s) failed')
@@ -0,0 +1,15 @@
+from api.search import update_search_index
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the full-text search index of all recipes, e.g. '
+            'after bulk loading them')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            update_search_index()
+        self.stdout.write(
+            f'{Recipe.objects.count()} recipe(s) indexed')
@@ -0,0 +1,62 @@
+import gzip
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+REFERENCE_CACHE_TIMEOUT = 300
+
+
+def reference_cache_key(basename):
+    return f'reference:{basename}'
+
+
+class CachedListMixin:
+    """Отдаёт неотфильтрованный список готовыми байтами JSON из кэша.
+
+    Кэш сбрасывается сигналами при изменении модели, а в остальных
+    воркерах живёт не дольше REFERENCE_CACHE_TIMEOUT.
+    """
+    compress = False
+
+    def build_cache_entry(self):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        content = JSONRenderer().render(serializer.data)
+        return {
+            'content': content,
+            'gzip': gzip.compress(content) if self.compress else None,
+            'etag': f'W/"{hashlib.sha1(content).hexdigest()}"',
+            'last_modified': time.time(),
+        }
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        key = reference_cache_key(self.basename)
+        entry = cache.get(key)
+        if entry is None:
+            entry = self.build_cache_entry()
+            cache.set(key, entry, REFERENCE_CACHE_TIMEOUT)
+
+        response = get_conditional_response(
+            request, etag=entry['etag'],
+            last_modified=int(entry['last_modified'])
+        )
+        if response is None:
+            accepts_gzip = 'gzip' in request.META.get(
+                'HTTP_ACCEPT_ENCODING', '')
+            if entry['gzip'] is not None and accepts_gzip:
+                response = HttpResponse(
+                    entry['gzip'], content_type='application/json')
+                response['Content-Encoding'] = 'gzip'
+            else:
+                response = HttpResponse(
+                    entry['content'], content_type='application/json')
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
@@ -1,6 +1,100 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from django.core.paginator import InvalidPage
+from django.db import connection
+from django.db.models import QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_count(queryset):
+    """Оценка из pg_class.reltuples, для фильтров — точный COUNT(*)"""
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return int(row[0])
+    return queryset.count()
+
+
+class KeysetPagination(CursorPagination):
+    page_size = 10
+    page_size_query_param = 'limit'
 
 
 class CustomPageNumberPagination(PageNumberPagination):
+    """Постраничная пагинация с ключевой (cursor) и облегчённой по счётчику.
+
+    ?cursor= переключает на keyset-пагинацию по сортировке запроса,
+    ?count=estimate отдаёт оценку вместо COUNT(*), ?count=none не
+    считает строки вовсе. Без этих параметров ответ прежний. Списки,
+    а не QuerySet, всегда делятся на страницы по номеру.
+    """
     page_size = 10
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        self.count_mode = request.query_params.get(
+            self.count_query_param, 'exact')
+        if not isinstance(queryset, QuerySet):
+            self.count_mode = 'exact'
+            return super().paginate_queryset(queryset, request, view)
+        if self.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            self.keyset.ordering = (queryset.query.order_by
+                                    or queryset.model._meta.ordering)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        if self.count_mode not in ('estimate', 'none'):
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_without_count(queryset, request)
+
+    def paginate_without_count(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(
+                request.query_params.get(self.page_query_param, 1))
+            if self.page_number < 1:
+                raise InvalidPage
+        except (InvalidPage, ValueError):
+            raise NotFound(self.invalid_page_message.format(
+                page_number=request.query_params.get(self.page_query_param),
+                message='Invalid page.'
+            ))
+        offset = (self.page_number - 1) * page_size
+        results = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(results) > page_size
+        self.total = (estimate_count(queryset)
+                      if self.count_mode == 'estimate' else None)
+        return results[:page_size]
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        if self.count_mode not in ('estimate', 'none'):
+            return super().get_paginated_response(data)
+        url = self.request.build_absolute_uri()
+        next_link = previous_link = None
+        if self.has_next:
+            next_link = replace_query_param(
+                url, self.page_query_param, self.page_number + 1)
+        if self.page_number == 2:
+            previous_link = remove_query_param(url, self.page_query_param)
+        elif self.page_number > 2:
+            previous_link = replace_query_param(
+                url, self.page_query_param, self.page_number - 1)
+        return Response(OrderedDict([
+            ('count', self.total),
+            ('next', next_link),
+            ('previous', previous_link),
+            ('results', data)
+        ]))
@@ -0,0 +1,115 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from itertools import chain
+
+from recipes.models import IngredientRecipe
+
+MAX_AGE = 300
+
+
+class PantryIndex:
+    """Обратный индекс: ингредиент -> отсортированный массив id рецептов.
+
+    Для набора ингредиентов считает, сколько из них есть в каждом
+    рецепте, и сортирует рецепты по числу недостающих. Сериализатор
+    рецептов обновляет индекс после коммита, а MAX_AGE ограничивает
+    время жизни индекса в остальных воркерах, как у IngredientIndex.
+    """
+
+    def __init__(self, max_age=MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._postings = None
+        self._recipes = None
+        self._built_at = 0
+
+    def build(self):
+        postings = defaultdict(list)
+        recipes = defaultdict(list)
+        for recipe_id, ingredient_id in IngredientRecipe.objects.order_by(
+            'recipe_id'
+        ).values_list('recipe_id', 'ingredient_id').iterator():
+            postings[ingredient_id].append(recipe_id)
+            recipes[recipe_id].append(ingredient_id)
+        # Строки идут по возрастанию recipe_id, списки уже отсортированы
+        self._postings = {
+            ingredient_id: array('I', recipe_ids)
+            for ingredient_id, recipe_ids in postings.items()
+        }
+        self._recipes = {
+            recipe_id: array('I', sorted(ingredient_ids))
+            for recipe_id, ingredient_ids in recipes.items()
+        }
+        self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+            self._recipes = None
+
+    def _ensure_built(self):
+        if (self._postings is None
+                or time.monotonic() - self._built_at > self.max_age):
+            self.build()
+
+    def _discard(self, recipe_id):
+        for ingredient_id in self._recipes.pop(recipe_id, ()):
+            recipe_ids = self._postings[ingredient_id]
+            position = bisect_left(recipe_ids, recipe_id)
+            if (position < len(recipe_ids)
+                    and recipe_ids[position] == recipe_id):
+                del recipe_ids[position]
+
+    def update(self, recipe_id, ingredient_ids):
+        """Заменяет ингредиенты рецепта в уже построенном индексе"""
+        with self._lock:
+            if self._postings is None:
+                return
+            self._discard(recipe_id)
+            ingredient_ids = array('I', sorted(set(ingredient_ids)))
+            self._recipes[recipe_id] = ingredient_ids
+            for ingredient_id in ingredient_ids:
+                insort(self._postings.setdefault(
+                    ingredient_id, array('I')), recipe_id)
+
+    def remove(self, recipe_id):
+        with self._lock:
+            if self._postings is not None:
+                self._discard(recipe_id)
+
+    def search(self, ingredient_ids, max_missing=None):
+        """[(recipe_id, сколько ингредиентов не хватает)]: сначала
+        рецепты, для которых есть всё, затем без одного и так далее"""
+        with self._lock:
+            self._ensure_built()
+            hits = Counter(chain.from_iterable(
+                self._postings.get(ingredient_id, ())
+                for ingredient_id in set(ingredient_ids)
+            ))
+            ranked = []
+            for recipe_id, found in hits.items():
+                missing = len(self._recipes[recipe_id]) - found
+                if max_missing is None or missing <= max_missing:
+                    ranked.append((missing, -found, -recipe_id))
+        ranked.sort()
+        return [(-recipe_id, missing) for missing, _, recipe_id in ranked]
+
+    def missing(self, recipe_ids, ingredient_ids):
+        """Недостающие ингредиенты каждого из рецептов recipe_ids"""
+        pantry = set(ingredient_ids)
+        with self._lock:
+            self._ensure_built()
+            return {
+                recipe_id: [
+                    ingredient_id
+                    for ingredient_id in self._recipes.get(recipe_id, ())
+                    if ingredient_id not in pantry
+                ]
+                for recipe_id in recipe_ids
+            }
+
+
+pantry_index = PantryIndex()
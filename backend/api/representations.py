@@ -0,0 +1,130 @@
+from collections import defaultdict
+
+from recipes.models import IngredientRecipe, Recipe
+from rest_framework.exceptions import ValidationError
+
+from .images import thumbnail_url, thumbnail_urls
+
+RECIPE_FIELDS = (
+    'id', 'tags', 'author', 'ingredients', 'is_favorited',
+    'is_in_shopping_cart', 'name', 'image', 'thumbnails', 'text',
+    'cooking_time',
+)
+FIELD_COLUMNS = {
+    'id': (),
+    'tags': (),
+    'author': (
+        'author_id', 'author__email', 'author__username',
+        'author__first_name', 'author__last_name', 'author_is_subscribed',
+    ),
+    'ingredients': (),
+    'is_favorited': ('is_favorited',),
+    'is_in_shopping_cart': ('is_in_shopping_cart',),
+    'name': ('name',),
+    'image': ('image', 'thumbnails_ready'),
+    'thumbnails': ('image', 'thumbnails_ready'),
+    'text': ('text',),
+    'cooking_time': ('cooking_time',),
+}
+
+
+def parse_fields(query_params):
+    """Поля рецепта из параметров fields= и omit= (через запятую)"""
+    fields = RECIPE_FIELDS
+    for param in ('fields', 'omit'):
+        value = query_params.get(param)
+        if not value:
+            continue
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = names.difference(RECIPE_FIELDS)
+        if unknown:
+            raise ValidationError(
+                {param: [f'Неизвестные поля: {", ".join(sorted(unknown))}']}
+            )
+        if param == 'fields':
+            fields = tuple(name for name in fields if name in names)
+        else:
+            fields = tuple(name for name in fields if name not in names)
+    return fields
+
+
+def recipe_values(queryset, fields=RECIPE_FIELDS):
+    columns = {'id': None}
+    for field in fields:
+        columns.update(dict.fromkeys(FIELD_COLUMNS[field]))
+    return queryset.values(*columns)
+
+
+def _tags(ids):
+    tags = defaultdict(list)
+    for recipe_id, tag_id, name, color, slug in (
+        Recipe.tags.through.objects.filter(
+            recipe_id__in=ids
+        ).order_by('tag__name').values_list(
+            'recipe_id', 'tag__id', 'tag__name', 'tag__color', 'tag__slug'
+        )
+    ):
+        tags[recipe_id].append(
+            {'id': tag_id, 'name': name, 'color': color, 'slug': slug})
+    return tags
+
+
+def _ingredients(ids):
+    ingredients = defaultdict(list)
+    for recipe_id, ingredient_id, name, measurement_unit, amount in (
+        IngredientRecipe.objects.filter(
+            recipe_id__in=ids
+        ).order_by('id').values_list(
+            'recipe_id', 'ingredient__id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'
+        )
+    ):
+        ingredients[recipe_id].append({
+            'id': ingredient_id,
+            'name': name,
+            'measurement_unit': measurement_unit,
+            'amount': amount,
+        })
+    return ingredients
+
+
+def build_recipes(rows, fields=RECIPE_FIELDS, image_size=None):
+    """Собирает рецепты из строк values() в том же виде, что и
+    RecipeSerializer, без вложенных сериализаторов DRF. С image_size
+    в image отдаётся уменьшенная копия картинки"""
+    ids = [row['id'] for row in rows]
+    if not ids:
+        return []
+    tags = _tags(ids) if 'tags' in fields else None
+    ingredients = _ingredients(ids) if 'ingredients' in fields else None
+    storage = Recipe._meta.get_field('image').storage
+    builders = {
+        'id': lambda row: row['id'],
+        'tags': lambda row: tags[row['id']],
+        'author': lambda row: {
+            'email': row['author__email'],
+            'id': row['author_id'],
+            'username': row['author__username'],
+            'first_name': row['author__first_name'],
+            'last_name': row['author__last_name'],
+            'is_subscribed': row['author_is_subscribed'],
+        },
+        'ingredients': lambda row: ingredients[row['id']],
+        'is_favorited': lambda row: row['is_favorited'],
+        'is_in_shopping_cart': lambda row: row['is_in_shopping_cart'],
+        'name': lambda row: row['name'],
+        'image': lambda row: (
+            thumbnail_url(row['image'], image_size, row['thumbnails_ready'],
+                          storage=storage)
+            if image_size else storage.url(row['image'])
+        ),
+        'thumbnails': lambda row: thumbnail_urls(
+            row['image'], row['thumbnails_ready'], storage=storage),
+        'text': lambda row: row['text'],
+        'cooking_time': lambda row: row['cooking_time'],
+    }
+    builders = [(field, builders[field]) for field in fields]
+    return [
+        {field: build(row) for field, build in builders}
+        for row in rows
+    ]
@@ -0,0 +1,105 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Count, F
+from recipes.models import IngredientRecipe
+
+from .autocomplete import normalize
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+FACET_SIZE = 20
+CHUNK_SIZE = 500
+WORD_RE = re.compile(r'\w+')
+
+# Название (вес A), описание (B) и названия ингредиентов (C)
+INGREDIENT_NAMES = """(
+    SELECT {aggregate}
+    FROM recipes_ingredientrecipe AS item
+    JOIN recipes_ingredient AS ingredient
+        ON ingredient.id = item.ingredient_id
+    WHERE item.recipe_id = recipe.id
+)"""
+POSTGRES_UPDATE = """
+UPDATE recipes_recipe AS recipe SET search_vector =
+    setweight(to_tsvector(%(config)s, recipe.name), 'A')
+    || setweight(to_tsvector(%(config)s, recipe.text), 'B')
+    || setweight(to_tsvector(%(config)s, coalesce({names}, '')), 'C')
+""".format(names=INGREDIENT_NAMES.format(
+    aggregate="string_agg(ingredient.name, ' ')"))
+SQLITE_INSERT = """
+INSERT INTO {table} (rowid, name, text, ingredients)
+SELECT recipe.id, {name}, {text}, {names}
+FROM recipes_recipe AS recipe
+"""
+
+
+def _fold(sql):
+    """FTS5 не сводит ё к е, как autocomplete.normalize"""
+    return f"replace(replace({sql}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def update_search_index(ids=None):
+    """Пересчитывает поисковый индекс рецептов ids или всех рецептов"""
+    ids = None if ids is None else list(ids)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            where = '' if ids is None else 'WHERE recipe.id = ANY(%(ids)s)'
+            cursor.execute(POSTGRES_UPDATE + where,
+                           {'config': SEARCH_CONFIG, 'ids': ids})
+            return
+        where, params = '', []
+        if ids is not None:
+            where = f'WHERE {{}} IN ({", ".join(["%s"] * len(ids))})'
+            params = ids
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} ' + where.format('rowid'), params)
+        cursor.execute(SQLITE_INSERT.format(
+            table=FTS_TABLE,
+            name=_fold('recipe.name'),
+            text=_fold('recipe.text'),
+            names=_fold(INGREDIENT_NAMES.format(
+                aggregate="group_concat(ingredient.name, ' ')")),
+        ) + where.format('recipe.id'), params)
+
+
+def update_ingredient_recipes(ingredient_id):
+    """Пересчитывает индекс рецептов с ингредиентом: его название
+    входит в поисковый документ"""
+    ids = list(IngredientRecipe.objects.filter(
+        ingredient_id=ingredient_id).values_list('recipe_id', flat=True))
+    for start in range(0, len(ids), CHUNK_SIZE):
+        update_search_index(ids[start:start + CHUNK_SIZE])
+
+
+def search_recipes(queryset, value):
+    """Рецепты по словам из названия, описания и ингредиентов,
+    самые релевантные сверху. PostgreSQL ищет по search_vector с
+    русской морфологией, SQLite — по префиксам слов в FTS5, ранг
+    там bm25 с весами полей из миграции"""
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(value, config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-id')
+    words = WORD_RE.findall(normalize(value))
+    if not words:
+        return queryset.none()
+    match = ' '.join(f'"{word}"*' for word in words)
+    return queryset.filter(search_document__document=match).annotate(
+        search_rank=F('search_document__rank') * -1
+    ).order_by('-search_rank', '-id')
+
+
+def ingredient_facet(queryset, size=FACET_SIZE):
+    """Самые частые ингредиенты среди найденных рецептов"""
+    return [
+        {'id': row['ingredient_id'], 'name': row['ingredient__name'],
+         'count': row['count']}
+        for row in IngredientRecipe.objects.filter(
+            recipe__in=queryset.order_by().values('id')
+        ).values('ingredient_id', 'ingredient__name').annotate(
+            count=Count('id')
+        ).order_by('-count', 'ingredient__name')[:size]
+    ]
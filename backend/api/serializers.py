@@ -1,12 +1,15 @@
-import base64
+from functools import partial
 
-from django.core.files.base import ContentFile
+from django.db import transaction
 from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 from users.models import Follow
 from users.serializers import CustomUserSerializer
 
+from .images import decode_data_uri, thumbnail_url, thumbnail_urls
+from .pantry import pantry_index
+
 
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор тэгов"""
@@ -46,9 +49,7 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = decode_data_uri(data)
 
         return super().to_internal_value(data)
 
@@ -68,20 +69,31 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'thumbnails',
+                  'text', 'cooking_time')
 
-    def validate(self, data):
-        tags = self.initial_data['tags']
+    def to_internal_value(self, data):
+        try:
+            self.validate_tags_and_ingredients(data)
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError(
+                detail=serializers.as_serializer_error(exc))
+        return super().to_internal_value(data)
+
+    def validate_tags_and_ingredients(self, data):
+        """Проверяет тэги и ингредиенты до декодирования картинки и
+        записи в базу: по одному запросу id__in на тэги и ингредиенты"""
+        tags = data.get('tags')
         if not tags:
             raise serializers.ValidationError(
                 'Нужно добавить хотя бы 1 тэг'
             )
-        ingredients = self.initial_data['ingredients']
+        ingredients = data.get('ingredients')
         if not ingredients:
             raise serializers.ValidationError(
                 'Нужно добавить хотя бы 1 ингредиент'
@@ -93,74 +105,161 @@ class RecipeSerializer(serializers.ModelSerializer):
                     f'{value} должен быть в формате list'
                 )
 
+        try:
+            tag_ids = {int(tag) for tag in tags}
+            ingredient_ids = [
+                int(ingredient['id']) for ingredient in ingredients
+            ]
+        except (KeyError, TypeError, ValueError):
+            raise serializers.ValidationError(
+                'id тэгов и ингредиентов должны быть числами'
+            )
+        if len(set(ingredient_ids)) != len(ingredient_ids):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться'
+            )
+
         for ingredient in ingredients:
-            if not ingredient['amount'].isdecimal():
-                raise serializers.ValidationError(
-                    'Количество ингредиента должно быть числом'
-                )
-            if not (1 <= int(ingredient['amount']) <= 10000):
-                raise serializers.ValidationError(
-                    'Количество ингредиента может быть от 1 до 10000'
-                )
-        if not (1 <= int(self.initial_data['cooking_time']) <= 1000):
+            self.validate_amount(ingredient.get('amount', ''))
+        self.check_exist(Tag, tag_ids, 'Тэги не найдены')
+        self.check_exist(Ingredient, ingredient_ids, 'Ингредиенты не найдены')
+
+    @staticmethod
+    def validate_amount(amount):
+        if not str(amount).isdecimal():
+            raise serializers.ValidationError(
+                'Количество ингредиента должно быть числом'
+            )
+        if not (1 <= int(amount) <= 10000):
+            raise serializers.ValidationError(
+                'Количество ингредиента может быть от 1 до 10000'
+            )
+
+    @staticmethod
+    def check_exist(model, ids, message):
+        """Одним запросом проверяет, что все id есть в базе"""
+        missing = set(ids).difference(
+            model.objects.filter(id__in=ids).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(f'{message}: {sorted(missing)}')
+
+    @staticmethod
+    def validate_image(value):
+        """Одинаковые картинки хранятся в одном файле"""
+        if not getattr(value, 'content_hashed', False):
+            return value
+        field = Recipe._meta.get_field('image')
+        name = field.generate_filename(None, value.name)
+        if field.storage.exists(name):
+            value.close()
+            return name
+        return value
+
+    @staticmethod
+    def validate_cooking_time(value):
+        if not (1 <= value <= 1000):
             raise serializers.ValidationError(
                 'Время приготовление может быть от 1 до 1000'
             )
-        data['tags'] = tags
-        data['ingredients'] = ingredients
+        return value
+
+    def validate(self, data):
+        data['tags'] = self.initial_data['tags']
+        data['ingredients'] = self.initial_data['ingredients']
         return data
 
+    @staticmethod
+    def save_ingredients(recipe, ingredients, existing=()):
+        """Приводит ингредиенты рецепта к списку из запроса: меняет только
+        изменившиеся количества, добавляет новые и удаляет лишние"""
+        existing = {item.ingredient_id: item for item in existing}
+        wanted = {
+            int(ingredient['id']): int(ingredient['amount'])
+            for ingredient in ingredients
+        }
+        changed = []
+        for ingredient_id, amount in wanted.items():
+            item = existing.get(ingredient_id)
+            if item is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        removed = [
+            item.id for ingredient_id, item in existing.items()
+            if ingredient_id not in wanted
+        ]
+        if removed:
+            IngredientRecipe.objects.filter(id__in=removed).delete()
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ['amount'])
+        IngredientRecipe.objects.bulk_create([
+            IngredientRecipe(
+                ingredient_id=ingredient_id,
+                recipe=recipe,
+                amount=amount
+            )
+            for ingredient_id, amount in wanted.items()
+            if ingredient_id not in existing
+        ])
+        transaction.on_commit(
+            partial(pantry_index.update, recipe.id, list(wanted)))
+
+    def save(self, **kwargs):
+        image = self.validated_data.get('image')
+        try:
+            recipe = super().save(**kwargs)
+        finally:
+            if hasattr(image, 'close'):
+                image.close()
+        # Ответ собирается с prefetch, без запроса на каждый ингредиент
+        self.instance = Recipe.objects.for_user(
+            self.context['request'].user).get(pk=recipe.pk)
+        return self.instance
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
-
-        ingredients_list = [
-            IngredientRecipe(
-                ingredient_id=ingredient['id'],
-                recipe=recipe,
-                amount=ingredient['amount']
-            )
-            for ingredient in ingredients
-        ]
-        IngredientRecipe.objects.bulk_create(ingredients_list)
-
+        self.save_ingredients(recipe, ingredients)
         recipe.tags.set(tags)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        if 'image' in validated_data:
-            instance.image = validated_data.get('image')
-        instance.name = validated_data.get('name')
-        instance.text = validated_data.get('text')
-        instance.cooking_time = validated_data.get('cooking_time')
-
-        instance.tags.clear()
-        tags = validated_data.get('tags')
-        instance.tags.set(tags)
-
-        IngredientRecipe.objects.filter(recipe=instance).all().delete()
-        ingredients = validated_data['ingredients']
-        ingredients_list = [
-            IngredientRecipe(
-                ingredient_id=ingredient['id'],
-                recipe=instance,
-                amount=ingredient['amount']
-            )
-            for ingredient in ingredients
-        ]
-        IngredientRecipe.objects.bulk_create(ingredients_list)
+        for field in ('image', 'name', 'text', 'cooking_time'):
+            if field in validated_data:
+                setattr(instance, field, validated_data[field])
+
+        instance.tags.set(validated_data.get('tags'))
+        self.save_ingredients(
+            instance,
+            validated_data['ingredients'],
+            instance.ingredientrecipe_set.all()
+        )
 
         instance.save()
         return instance
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
+    @staticmethod
+    def get_thumbnails(obj):
+        return thumbnail_urls(obj.image.name, obj.thumbnails_ready)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return Recipe.objects.favorite(user, obj.id).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -168,11 +267,32 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 
 class MiniRecipeSerializer(serializers.ModelSerializer):
-    # image = Base64ImageField()
+    """Краткий рецепт с уменьшенной картинкой"""
+    image = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
+
+    @staticmethod
+    def get_image(obj):
+        return thumbnail_url(obj.image.name, 'mini', obj.thumbnails_ready)
+
+    @staticmethod
+    def get_thumbnails(obj):
+        return thumbnail_urls(obj.image.name, obj.thumbnails_ready)
+
+
+class PantrySerializer(serializers.Serializer):
+    """Ингредиенты, которые есть у пользователя"""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=200
+    )
+    max_missing = serializers.IntegerField(
+        min_value=0, required=False, default=None)
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -194,14 +314,21 @@ class FollowSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def get_is_subscribed(obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Follow.objects.filter(user=obj.user,
                                      following=obj.following).exists()
 
     @staticmethod
     def get_recipes_count(obj):
-        return Recipe.objects.filter(author=obj.following).count()
+        return obj.following.recipes_count
 
     def get_recipes(self, obj):
+        recipes = self.context.get('recipes')
+        if recipes is not None:
+            return MiniRecipeSerializer(
+                recipes.get(obj.following_id, []), many=True
+            ).data
         request = self.context.get('request')
         recipes_limit = request.GET.get('recipes_limit')
         queryset = Recipe.objects.filter(author=obj.following)
@@ -0,0 +1,155 @@
+import csv
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+from django.core.cache import caches
+from recipes.models import IngredientRecipe
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+FONT_NAME = 'DejaVuSerif'
+FONT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'DejaVuSerif.ttf'
+)
+TITLE = 'Список покупок:'
+MARGIN_LEFT = 100
+MARGIN_TOP = 100
+MARGIN_BOTTOM = 50
+LINE_HEIGHT = 15
+CACHE_ALIAS = 'shopping_list'
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    """Регистрирует шрифт один раз на процесс"""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+def format_line(ingredient):
+    return (f'{ingredient["ingredient__name"]} '
+            f'({ingredient["ingredient__measurement_unit"]}) - '
+            f'{ingredient["total"]}')
+
+
+def render_pdf(ingredients, stream):
+    """Пишет список покупок в stream, разбивая его на страницы"""
+    register_font()
+    p = canvas.Canvas(stream, pagesize=A4, bottomup=0)
+    _, page_height = A4
+    p.setFont(FONT_NAME, 14)
+    p.drawString(MARGIN_LEFT, MARGIN_TOP, TITLE)
+    p.setFont(FONT_NAME, 12)
+    height = MARGIN_TOP + LINE_HEIGHT
+    for ingredient in ingredients:
+        if height > page_height - MARGIN_BOTTOM:
+            p.showPage()
+            p.setFont(FONT_NAME, 12)
+            height = MARGIN_TOP
+        p.drawString(MARGIN_LEFT, height, format_line(ingredient))
+        height += LINE_HEIGHT
+    p.showPage()
+    p.save()
+
+
+class _Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def render_txt(ingredients):
+    yield f'{TITLE}\n'
+    for ingredient in ingredients:
+        yield f'{format_line(ingredient)}\n'
+
+
+def render_csv(ingredients):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['total'],
+        ))
+
+
+def render_json(ingredients):
+    separator = '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['total'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']' if separator == ',' else '[]'
+
+
+STREAMING_RENDERERS = {
+    'txt': render_txt,
+    'csv': render_csv,
+    'json': render_json,
+}
+
+
+def _digest_key(user_id):
+    return f'digest:{user_id}'
+
+
+def _document_key(user_id, digest):
+    return f'document:{user_id}:{digest}'
+
+
+def compute_digest(user_id):
+    """Хэш содержимого корзины: рецепты, ингредиенты и их количество"""
+    rows = IngredientRecipe.objects.filter(
+        recipe__cart__user_id=user_id
+    ).order_by('recipe_id', 'ingredient_id').values_list(
+        'recipe_id', 'ingredient_id', 'amount'
+    )
+    hasher = hashlib.sha1()
+    for row in rows.iterator():
+        hasher.update(f'{row};'.encode())
+    return hasher.hexdigest()
+
+
+def cart_digest(user):
+    """Хэш корзины из кэша, при промахе считается заново"""
+    cache = caches[CACHE_ALIAS]
+    key = _digest_key(user.id)
+    digest = cache.get(key)
+    if digest is None:
+        digest = compute_digest(user.id)
+        cache.set(key, digest)
+    return digest
+
+
+def get_document(user, digest):
+    return caches[CACHE_ALIAS].get(_document_key(user.id, digest))
+
+
+def set_document(user, digest, content):
+    caches[CACHE_ALIAS].set(_document_key(user.id, digest), content)
+
+
+def invalidate(user_ids):
+    """Сбрасывает хэши корзин вместе с документами, собранными по ним.
+    Документ, записанный по старому хэшу уже после сброса, истечёт по
+    TIMEOUT кэша"""
+    cache = caches[CACHE_ALIAS]
+    digest_keys = {_digest_key(user_id): user_id for user_id in user_ids}
+    digests = cache.get_many(list(digest_keys))
+    cache.delete_many(list(digest_keys) + [
+        _document_key(digest_keys[key], digest)
+        for key, digest in digests.items()
+    ])
+
+
+def invalidate_all():
+    caches[CACHE_ALIAS].clear()
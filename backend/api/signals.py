@@ -0,0 +1,113 @@
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from jobs.models import Job
+from jobs.queue import enqueue
+from recipes.models import Cart, Ingredient, IngredientRecipe, Recipe, Tag
+from users.models import Follow
+
+from . import feeds, shopping_list, similarity
+from .autocomplete import ingredient_index
+from .mixins import reference_cache_key
+from .pantry import pantry_index
+from .search import update_ingredient_recipes, update_search_index
+
+_changed = threading.local()
+
+
+def _changed_recipes():
+    if not hasattr(_changed, 'recipe_ids'):
+        _changed.recipe_ids = set()
+    return _changed.recipe_ids
+
+
+def _recipes_changed():
+    recipe_ids = _changed_recipes()
+    if not recipe_ids:
+        return
+    ids = list(recipe_ids)
+    recipe_ids.clear()
+    update_search_index(ids)
+    if similarity.is_built():
+        enqueue('refresh_similarity', {'recipe_ids': ids})
+    shopping_list.invalidate(
+        Cart.objects.filter(recipe_id__in=ids).order_by().values_list(
+            'user_id', flat=True).distinct()
+    )
+
+
+@receiver([post_save, post_delete], sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    """Хэш корзины сбрасывается после коммита: сброшенный раньше, он
+    успел бы заново посчитаться по старой корзине в другом запросе"""
+    transaction.on_commit(
+        partial(shopping_list.invalidate, [instance.user_id]))
+
+
+@receiver([post_save, post_delete], sender=IngredientRecipe)
+@receiver(post_save, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    """Поисковый индекс, матрица похожести и корзины с рецептом
+    обновляются после коммита разом, сколько бы строк рецепта ни
+    поменялось"""
+    _changed_recipes().add(
+        instance.recipe_id if sender is IngredientRecipe else instance.id)
+    transaction.on_commit(_recipes_changed)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, update_fields=None, **kwargs):
+    if not instance.image or (
+            update_fields is not None and 'image' not in update_fields):
+        return
+    name = instance.image.name
+    job = enqueue('make_thumbnails', {'name': name},
+                  key=f'thumbnails:{name}')
+    # Картинка могла уже встречаться в другом рецепте, тогда миниатюры
+    # готовы; иначе флаг выставит задача
+    ready = job.status == Job.DONE
+    if instance.thumbnails_ready != ready:
+        Recipe.objects.filter(pk=instance.pk).update(thumbnails_ready=ready)
+        instance.thumbnails_ready = ready
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created and settings.FEED_FANOUT_MIN_FOLLOWS:
+        enqueue('fan_out_recipe', {'recipe_id': instance.id},
+                key=f'fan_out:{instance.id}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    """Лента собирается в фоне, как только подписок набралось
+    достаточно; дальше её пополняет fan_out_recipe"""
+    if created and feeds.needs_feed(instance.user_id):
+        enqueue('build_feed', {'user_id': instance.user_id})
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    transaction.on_commit(shopping_list.invalidate_all)
+    ingredient_index.invalidate()
+    pantry_index.invalidate()
+    cache.delete(reference_cache_key('ingredient'))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    """Переименование ингредиента меняет поисковый индекс рецептов с
+    ним. При удалении индекс обновляют сигналы IngredientRecipe"""
+    if not created:
+        transaction.on_commit(
+            partial(update_ingredient_recipes, instance.id))
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    cache.delete(reference_cache_key('tag'))
@@ -0,0 +1,212 @@
+import fcntl
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from recipes.models import IngredientRecipe, Recipe
+from scipy import sparse
+
+CURRENT = 'current'
+LOCK = '.lock'
+ARRAYS = ('ids', 'indptr', 'indices', 'data')
+# Тэгов мало и они общие для многих рецептов, поэтому весят меньше
+TAG_WEIGHT = 0.5
+
+
+def _column(kind, key):
+    """Ингредиенты в чётных столбцах, тэги в нечётных"""
+    return 2 * key + (kind == 'tag')
+
+
+def recipe_matrix(recipe_ids=None):
+    """id рецептов по возрастанию и матрица рецепт x признак с
+    нормированными строками: скалярное произведение строк — косинус"""
+    recipes = Recipe.objects.order_by('id')
+    ingredients = IngredientRecipe.objects.order_by()
+    tags = Recipe.tags.through.objects.order_by()
+    if recipe_ids is not None:
+        recipes = recipes.filter(id__in=recipe_ids)
+        ingredients = ingredients.filter(recipe_id__in=recipe_ids)
+        tags = tags.filter(recipe_id__in=recipe_ids)
+    ids = np.array(
+        list(recipes.values_list('id', flat=True)), dtype=np.int32)
+    rows, columns, weights = [], [], []
+    for kind, queryset, key, weight in (
+        ('ingredient', ingredients, 'ingredient_id', 1.0),
+        ('tag', tags, 'tag_id', TAG_WEIGHT),
+    ):
+        for recipe_id, feature in queryset.values_list(
+                'recipe_id', key).iterator():
+            rows.append(recipe_id)
+            columns.append(_column(kind, feature))
+            weights.append(weight)
+    rows = np.array(rows, dtype=np.int32)
+    positions = np.searchsorted(ids, rows)
+    # Строки рецептов, созданных после выборки ids, отбрасываются
+    known = positions < len(ids)
+    known[known] = ids[positions[known]] == rows[known]
+    columns = np.array(columns, dtype=np.int32)[known]
+    matrix = sparse.csr_matrix(
+        (np.array(weights, dtype=np.float32)[known],
+         (positions[known], columns)),
+        shape=(len(ids), int(columns.max()) + 1 if len(columns) else 0),
+        dtype=np.float32
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return ids, sparse.diags(1 / norms).dot(matrix).tocsr()
+
+
+def _widen(matrix, width):
+    return sparse.csr_matrix(
+        (matrix.data, matrix.indices, matrix.indptr),
+        shape=(matrix.shape[0], width)
+    )
+
+
+@contextmanager
+def _write_lock(directory):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read(directory, mmap_mode=None):
+    """(версия, ids, матрица) или None, если матрицы ещё нет"""
+    try:
+        version = os.readlink(os.path.join(directory, CURRENT))
+        arrays = {
+            name: np.load(os.path.join(directory, version, f'{name}.npy'),
+                          mmap_mode=mmap_mode)
+            for name in ARRAYS
+        }
+    except OSError:
+        return None
+    indices = arrays['indices']
+    width = int(indices.max()) + 1 if len(indices) else 0
+    # Все массивы int32/float32: scipy не копирует их из mmap
+    return version, arrays['ids'], sparse.csr_matrix(
+        (arrays['data'], indices, arrays['indptr']),
+        shape=(len(arrays['ids']), width), copy=False
+    )
+
+
+def _write(directory, ids, matrix):
+    """Новая версия в отдельном каталоге, затем атомарная подмена
+    ссылки current. Старые версии удаляются: уже открытые mmap
+    продолжают работать"""
+    matrix.sort_indices()
+    version = str(time.time_ns())
+    staging = os.path.join(directory, f'.{version}')
+    os.makedirs(staging)
+    for name, array in (
+        ('ids', ids.astype(np.int32)),
+        ('indptr', matrix.indptr.astype(np.int32)),
+        ('indices', matrix.indices.astype(np.int32)),
+        ('data', matrix.data.astype(np.float32)),
+    ):
+        np.save(os.path.join(staging, f'{name}.npy'), array)
+    os.rename(staging, os.path.join(directory, version))
+    link = os.path.join(directory, f'.{version}.link')
+    os.symlink(version, link)
+    os.replace(link, os.path.join(directory, CURRENT))
+    for name in os.listdir(directory):
+        if name not in (version, CURRENT, LOCK):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return version
+
+
+def build(directory=None):
+    """Строит матрицу по всем рецептам заново"""
+    directory = directory or settings.SIMILARITY_DIR
+    with _write_lock(directory):
+        ids, matrix = recipe_matrix()
+        _write(directory, ids, matrix)
+    return ids, matrix
+
+
+def is_built(directory=None):
+    return os.path.lexists(
+        os.path.join(directory or settings.SIMILARITY_DIR, CURRENT))
+
+
+def refresh(recipe_ids, directory=None):
+    """Пересчитывает строки изменённых рецептов, удалённые убирает.
+    Без построенной матрицы ничего не делает"""
+    directory = directory or settings.SIMILARITY_DIR
+    with _write_lock(directory):
+        current = _read(directory)
+        if current is None:
+            return
+        _, old_ids, old_matrix = current
+        keep = ~np.isin(old_ids, recipe_ids)
+        new_ids, new_matrix = recipe_matrix(recipe_ids)
+        width = max(old_matrix.shape[1], new_matrix.shape[1])
+        ids = np.concatenate([old_ids[keep], new_ids])
+        matrix = sparse.vstack([
+            _widen(old_matrix[keep], width), _widen(new_matrix, width)
+        ]).tocsr()
+        order = np.argsort(ids, kind='stable')
+        _write(directory, ids[order], matrix[order])
+
+
+class SimilarityIndex:
+    """Матрица похожести из SIMILARITY_DIR, отображённая в память.
+
+    Воркеры gunicorn делят страницы файлов через кэш ОС. Перед каждым
+    запросом проверяется ссылка current, и после refresh или build
+    подхватывается новая версия.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._version = None
+        self._ids = None
+        self._matrix = None
+
+    def _ensure_loaded(self):
+        directory = self.directory or settings.SIMILARITY_DIR
+        try:
+            version = os.readlink(os.path.join(directory, CURRENT))
+        except OSError:
+            return False
+        if version != self._version:
+            current = _read(directory, mmap_mode='r')
+            if current is not None:
+                self._version, self._ids, self._matrix = current
+        return self._matrix is not None
+
+    def similar(self, recipe_id, limit):
+        """[(recipe_id, косинус)] по убыванию похожести или None, если
+        рецепта нет в матрице"""
+        with self._lock:
+            if not self._ensure_loaded():
+                return None
+            ids, matrix = self._ids, self._matrix
+        row = int(np.searchsorted(ids, recipe_id))
+        if row >= len(ids) or ids[row] != recipe_id:
+            return None
+        scores = np.asarray(
+            matrix.dot(matrix[row].T).todense()).ravel()
+        scores[row] = 0
+        limit = min(limit, len(scores) - 1)
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.lexsort((-ids[top], -scores[top]))]
+        return [
+            (int(ids[position]), float(scores[position]))
+            for position in top if scores[position] > 0
+        ]
+
+
+similarity_index = SimilarityIndex()
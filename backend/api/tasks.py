@@ -0,0 +1,37 @@
+from io import BytesIO
+
+from jobs.queue import task
+from recipes.models import IngredientRecipe, Recipe
+
+from . import feeds, shopping_list, similarity
+from .images import make_thumbnails
+
+
+@task('make_thumbnails')
+def make_recipe_thumbnails(name):
+    make_thumbnails(name)
+    Recipe.objects.filter(image=name).update(thumbnails_ready=True)
+
+
+@task('render_shopping_list')
+def render_shopping_list(user_id):
+    """PDF списка покупок, его забирает download_shopping_cart"""
+    stream = BytesIO()
+    shopping_list.render_pdf(
+        IngredientRecipe.objects.shopping_list(user_id).iterator(), stream)
+    return stream.getvalue()
+
+
+@task('fan_out_recipe')
+def fan_out_recipe(recipe_id):
+    feeds.fan_out(recipe_id)
+
+
+@task('build_feed')
+def build_feed(user_id):
+    feeds.build(user_id)
+
+
+@task('refresh_similarity')
+def refresh_similarity(recipe_ids):
+    similarity.refresh(recipe_ids)
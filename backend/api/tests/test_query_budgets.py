@@ -0,0 +1,269 @@
+import base64
+import io
+import os
+import random
+import tempfile
+
+from api import similarity
+from api.pantry import pantry_index
+from api.search import update_search_index
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from recipes.models import (Cart, Favorite, Ingredient, IngredientRecipe,
+                            Recipe, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Follow, User
+
+LOCAL_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'query-budget-{alias}'}
+    for alias in ('default', 'shopping_list')
+}
+# Списки проверяются на двух размерах страницы: число запросов не должно
+# зависеть от числа объектов
+PAGE_SIZES = (1, 10)
+
+
+def image_data():
+    content = io.BytesIO()
+    Image.new('RGB', (64, 64), 'orange').save(content, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        content.getvalue()).decode()
+
+
+def seed():
+    """Пользователи с подписками, рецепты с 5-15 ингредиентами,
+    избранное и корзина у первого пользователя. Возвращает этого
+    пользователя и id для подстановки в адреса"""
+    rng = random.Random(0)
+    User.objects.bulk_create(
+        User(username=f'user{i}', email=f'user{i}@example.com',
+             first_name='Имя', last_name='Фамилия')
+        for i in range(30)
+    )
+    users = list(User.objects.order_by('id'))
+    Tag.objects.bulk_create(
+        Tag(name=f'Тэг {i}', color='#E26C2D', slug=f'tag-{i}')
+        for i in range(3)
+    )
+    tags = list(Tag.objects.order_by('id'))
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+        for i in range(200)
+    )
+    ingredients = list(Ingredient.objects.values_list('id', flat=True))
+    Recipe.objects.bulk_create(
+        Recipe(author=users[i % len(users)], name=f'Рецепт {i}',
+               image='recipes/images/seed.png', text='Текст',
+               cooking_time=10)
+        for i in range(120)
+    )
+    recipes = list(Recipe.objects.order_by('id'))
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+        for recipe in recipes
+        for tag in rng.sample(tags, rng.randint(1, len(tags)))
+    )
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(recipe_id=recipe.id, ingredient_id=ingredient,
+                         amount=rng.randint(1, 500))
+        for recipe in recipes
+        for ingredient in rng.sample(ingredients, rng.randint(5, 15))
+    )
+    user, author = users[0], users[1]
+    Follow.objects.bulk_create(
+        Follow(user=follower, following=following)
+        for follower in users
+        for following in rng.sample(users, 5)
+        if follower != following and following != author
+    )
+    own = [recipe for recipe in recipes if recipe.author_id == user.id]
+    others = [recipe for recipe in recipes if recipe.author_id != user.id]
+    Favorite.objects.bulk_create(
+        Favorite(user=user, recipe=recipe) for recipe in others[:40])
+    Cart.objects.bulk_create(
+        Cart(user=user, recipe=recipe) for recipe in others[:20])
+    call_command('recount', stdout=io.StringIO())
+    update_search_index()
+    # Индекс кладовой строится при первом запросе, бюджет считается
+    # для уже построенного
+    pantry_index.build()
+    similarity.build()
+    return user, {
+        'recipe': own[0].id,
+        'other_recipe': others[-1].id,
+        'author': author.id,
+        'tag': tags[0].id,
+        'ingredient': ingredients[0],
+        'recipe_ingredient': IngredientRecipe.objects.filter(
+            recipe=recipes[0]).values_list(
+            'ingredient_id', flat=True).first(),
+    }
+
+
+class QueryBudgetMixin:
+    """Число SQL-запросов маршрута API. Бюджет включает запрос токена
+    при аутентификации"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media = tempfile.TemporaryDirectory()
+        cls.test_settings = override_settings(
+            CACHES=LOCAL_CACHES, JOBS_EAGER=False,
+            MEDIA_ROOT=cls.media.name,
+            SIMILARITY_DIR=os.path.join(cls.media.name, 'similarity')
+        )
+        cls.test_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.test_settings.disable()
+        cls.media.cleanup()
+
+    def authenticate(self, user):
+        self.client = APIClient()
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def assert_budget(self, budget, method, url, data=None):
+        """Запрос укладывается не больше чем в budget запросов: на SQLite и
+        PostgreSQL их число немного различается. Адреса с {limit}
+        проверяются на каждом размере страницы и должны давать одинаковое
+        число запросов"""
+        sizes = PAGE_SIZES if '{limit}' in url else (None,)
+        counts = []
+        for size in sizes:
+            path = url.format(limit=size, **self.ids)
+            with self.subTest(path=path):
+                with CaptureQueriesContext(connection) as queries:
+                    response = getattr(self.client, method)(
+                        path, data=data, format='json')
+                self.assertLess(response.status_code, 400,
+                                getattr(response, 'data', None))
+                self.assertLessEqual(len(queries), budget, [
+                    query['sql'] for query in queries.captured_queries])
+                counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1, counts)
+
+
+class ReadQueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.ids = seed()
+
+    def setUp(self):
+        self.authenticate(self.user)
+
+    def test_tags(self):
+        self.assert_budget(2, 'get', '/api/tags/')
+        self.assert_budget(2, 'get', '/api/tags/{tag}/')
+
+    def test_ingredients(self):
+        self.assert_budget(2, 'get', '/api/ingredients/')
+        self.assert_budget(2, 'get', '/api/ingredients/?name=ингр')
+        self.assert_budget(2, 'get', '/api/ingredients/{ingredient}/')
+
+    def test_recipes_list(self):
+        self.assert_budget(5, 'get', '/api/recipes/?limit={limit}')
+        self.assert_budget(5, 'get', '/api/recipes/?limit={limit}&page=2')
+        self.assert_budget(4, 'get', '/api/recipes/?limit={limit}&cursor=')
+        self.assert_budget(
+            3, 'get', '/api/recipes/?limit={limit}&fields=id,name,image')
+
+    def test_recipes_filters(self):
+        self.assert_budget(5, 'get', '/api/recipes/?limit={limit}&tags=tag-0')
+        self.assert_budget(
+            6, 'get', '/api/recipes/?limit={limit}&author={author}')
+        self.assert_budget(
+            5, 'get', '/api/recipes/?limit={limit}&is_favorited=1')
+        self.assert_budget(
+            5, 'get', '/api/recipes/?limit={limit}&is_in_shopping_cart=1')
+        self.assert_budget(
+            5, 'get', '/api/recipes/?limit={limit}&ordering=-favorites_count')
+
+    def test_recipes_search(self):
+        self.assert_budget(
+            6, 'get', '/api/recipes/?limit={limit}&search=рецепт')
+        self.assert_budget(
+            7, 'get', '/api/recipes/?limit={limit}&search=рецепт'
+                      '&ingredients={recipe_ingredient}')
+
+    def test_recipe_detail(self):
+        self.assert_budget(4, 'get', '/api/recipes/{recipe}/')
+        self.assert_budget(4, 'get', '/api/recipes/{other_recipe}/similar/')
+
+    def test_recipes_pantry(self):
+        self.assert_budget(
+            4, 'post', '/api/recipes/pantry/?limit={limit}',
+            {'ingredients': [self.ids['ingredient'] + i for i in range(30)]}
+        )
+
+    def test_recipes_feed(self):
+        self.assert_budget(4, 'get', '/api/recipes/feed/?limit={limit}')
+
+    def test_download_shopping_cart(self):
+        self.assert_budget(
+            2, 'get', '/api/recipes/download_shopping_cart/?format=txt')
+        self.assert_budget(
+            3, 'get', '/api/recipes/download_shopping_cart/?format=pdf')
+
+    def test_users(self):
+        self.assert_budget(3, 'get', '/api/users/?limit={limit}')
+        self.assert_budget(2, 'get', '/api/users/{author}/')
+        self.assert_budget(2, 'get', '/api/users/me/')
+
+    def test_subscriptions(self):
+        self.assert_budget(
+            4, 'get',
+            '/api/users/subscriptions/?limit={limit}&recipes_limit=3')
+
+
+class WriteQueryBudgetTests(QueryBudgetMixin, TransactionTestCase):
+    """Изменения проверяются с настоящими коммитами: бюджет включает
+    работу, отложенную в transaction.on_commit"""
+
+    def setUp(self):
+        user, self.ids = seed()
+        self.authenticate(user)
+
+    def recipe_payload(self):
+        return {
+            'name': 'Проверка', 'text': 'Текст', 'cooking_time': 15,
+            'image': image_data(), 'tags': [self.ids['tag']],
+            'ingredients': [
+                {'id': self.ids['ingredient'] + i, 'amount': 10 * (i + 1)}
+                for i in range(8)
+            ],
+        }
+
+    def test_recipe_create(self):
+        self.assert_budget(23, 'post', '/api/recipes/', self.recipe_payload())
+
+    def test_recipe_update(self):
+        self.assert_budget(
+            25, 'patch', '/api/recipes/{recipe}/', self.recipe_payload())
+
+    def test_recipe_delete(self):
+        self.assert_budget(17, 'delete', '/api/recipes/{recipe}/')
+
+    def test_favorite(self):
+        self.assert_budget(8, 'post', '/api/recipes/{other_recipe}/favorite/')
+        self.assert_budget(
+            5, 'delete', '/api/recipes/{other_recipe}/favorite/')
+
+    def test_shopping_cart(self):
+        self.assert_budget(
+            8, 'post', '/api/recipes/{other_recipe}/shopping_cart/')
+        self.assert_budget(
+            6, 'delete', '/api/recipes/{other_recipe}/shopping_cart/')
+
+    def test_subscribe(self):
+        self.assert_budget(10, 'post', '/api/users/{author}/subscribe/')
+        self.assert_budget(5, 'delete', '/api/users/{author}/subscribe/')
@@ -1,4 +1,5 @@
-from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from api.views import (IngredientViewSet, JobMetricsView, RecipeViewSet,
+                       RequestMetricsView, TagViewSet)
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 from users.views import CustomUserViewSet
@@ -13,6 +14,8 @@ router.register('recipes', RecipeViewSet)
 router.register('users', CustomUserViewSet)
 
 urlpatterns = [
+    path('jobs/metrics/', JobMetricsView.as_view(), name='job-metrics'),
+    path('metrics/', RequestMetricsView.as_view(), name='request-metrics'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -1,39 +1,65 @@
-import io
-import os
+from functools import partial
 
-from django.http import FileResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import (HttpResponse, HttpResponseNotModified,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
+from jobs.models import Job
+from jobs.queue import enqueue, metrics, requeue
 from recipes.models import (Cart, Favorite, Ingredient, IngredientRecipe,
                             Recipe, Tag)
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from users.models import User, decremented
 
-from .filters import IngredientSearchFilter, RecipeFilter
-from .pagination import CustomPageNumberPagination
+from backend.middleware import request_stats
+
+from . import feeds, shopping_list
+from .autocomplete import ingredient_index
+from .filters import RecipeFilter
+from .mixins import CachedListMixin
+from .pagination import CustomPageNumberPagination, KeysetPagination
+from .pantry import pantry_index
 from .permissions import IsAdminOrReadOnly, IsOwnerOrReadOnly
+from .renderers import (CSVRenderer, PDFRenderer, PlainTextRenderer,
+                        ShoppingListJSONRenderer)
+from .representations import (RECIPE_FIELDS, build_recipes, parse_fields,
+                              recipe_values)
+from .search import ingredient_facet
 from .serializers import (IngredientSerializer, MiniRecipeSerializer,
-                          RecipeSerializer, TagSerializer)
+                          PantrySerializer, RecipeSerializer, TagSerializer)
+from .similarity import similarity_index
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    compress = True
+    search_limit = 50
 
-    filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get('limit', '')
+        return Response(ingredient_index.search(
+            name, int(limit) if limit.isdecimal() else self.search_limit
+        ))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -43,101 +69,246 @@ class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = CustomPageNumberPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    similar_limit = 10
+    similar_max_limit = 50
+
+    def get_fields(self):
+        """Поля рецепта: в списке можно сузить через fields= и omit="""
+        if self.action in ('list', 'feed', 'pantry', 'similar'):
+            return parse_fields(self.request.query_params)
+        return RECIPE_FIELDS
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            return recipe_values(
+                Recipe.objects.with_user_flags(self.request.user),
+                self.get_fields()
+            )
+        return Recipe.objects.for_user(self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        response = self.get_paginated_response(
+            build_recipes(page, self.get_fields(), image_size='grid'))
+        if request.query_params.get('search'):
+            response.data['facets'] = {
+                'ingredients': ingredient_facet(queryset)}
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(build_recipes([self.get_object()])[0])
+
+    @action(methods=['get'], detail=False,
+            permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые сверху, по курсору"""
+        user = request.user
+        queryset = recipe_values(
+            feeds.feed_recipes(
+                user, feeds.is_materialized(user)
+            ).with_user_flags(user),
+            self.get_fields()
+        )
+        paginator = KeysetPagination()
+        paginator.ordering = '-id'
+        page = paginator.paginate_queryset(queryset, request, self)
+        return paginator.get_paginated_response(
+            build_recipes(page, self.get_fields(), image_size='grid'))
+
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        User.objects.filter(pk=self.request.user.pk).update(
+            recipes_count=F('recipes_count') + 1)
 
-    @action(methods=['POST', 'DELETE'], detail=True,
-            permission_classes=(IsAuthenticated,)
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        transaction.on_commit(partial(pantry_index.remove, instance.id))
+        instance.delete()
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=decremented('recipes_count'))
+
+    @action(methods=['post'], detail=False)
+    def pantry(self, request):
+        """Рецепты из ингредиентов пользователя: сначала те, для которых
+        есть всё, затем без одного ингредиента и так далее"""
+        serializer = PantrySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ingredients = serializer.validated_data['ingredients']
+        page = self.paginate_queryset(pantry_index.search(
+            ingredients, serializer.validated_data['max_missing']))
+        ids = [recipe_id for recipe_id, _ in page]
+        rows = {
+            row['id']: row for row in recipe_values(
+                Recipe.objects.with_user_flags(request.user).filter(
+                    id__in=ids),
+                self.get_fields()
             )
-    def favorite(self, request, pk):
+        }
+        missing = pantry_index.missing(ids, ingredients)
+        rows = [rows[recipe_id] for recipe_id in ids if recipe_id in rows]
+        recipes = build_recipes(rows, self.get_fields(), image_size='grid')
+        # id есть в каждой строке, но в ответе его может не быть (omit=id)
+        for row, recipe in zip(rows, recipes):
+            recipe['missing'] = missing[row['id']]
+        return self.get_paginated_response(recipes)
+
+    @action(methods=['get'], detail=True)
+    def similar(self, request, pk):
+        """Рецепты с похожими ингредиентами и тэгами, самые похожие
+        первыми"""
+        limit = request.query_params.get('limit', '')
+        limit = (min(int(limit), self.similar_max_limit)
+                 if limit.isdecimal() else self.similar_limit)
+        if not pk.isdecimal():
+            raise NotFound
+        similar = similarity_index.similar(int(pk), limit)
+        if similar is None:
+            # Рецепт создан после сборки матрицы или его нет вовсе
+            get_object_or_404(Recipe.objects.only('id'), pk=pk)
+            return Response([])
+        scores = dict(similar)
+        rows = {
+            row['id']: row for row in recipe_values(
+                Recipe.objects.with_user_flags(request.user).filter(
+                    id__in=scores),
+                self.get_fields()
+            )
+        }
+        rows = [rows[recipe_id] for recipe_id, _ in similar
+                if recipe_id in rows]
+        recipes = build_recipes(rows, self.get_fields(), image_size='grid')
+        for row, recipe in zip(rows, recipes):
+            recipe['similarity'] = round(scores[row['id']], 4)
+        return Response(recipes)
+
+    @transaction.atomic
+    def toggle_recipe(self, request, pk, model, counter, already_added,
+                      not_added):
+        """Добавляет рецепт в избранное или корзину и обновляет счётчик"""
         recipe = get_object_or_404(Recipe, id=pk)
         user = request.user
         if request.method == 'POST':
-            favorite, created = Favorite.objects.get_or_create(
+            _, created = model.objects.get_or_create(
                 user=user, recipe=recipe)
             if not created:
                 return Response(
-                    {'errors': 'Рецепт уже добавлен в избранное'},
+                    {'errors': already_added},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            Recipe.objects.filter(pk=recipe.pk).update(
+                **{counter: F(counter) + 1})
             serializer = MiniRecipeSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if request.method == 'DELETE':
-            favorite = Favorite.objects.filter(user=user, recipe=recipe)
-            if favorite.exists():
-                favorite.delete()
-                return Response(status.HTTP_204_NO_CONTENT)
-            return Response(
-                {'errors': 'Рецепта нет в избранном'},
-                status.HTTP_400_BAD_REQUEST
+        deleted, _ = model.objects.filter(user=user, recipe=recipe).delete()
+        if deleted:
+            Recipe.objects.filter(pk=recipe.pk).update(
+                **{counter: decremented(counter)})
+            return Response(status.HTTP_204_NO_CONTENT)
+        return Response(
+            {'errors': not_added},
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(methods=['POST', 'DELETE'], detail=True,
+            permission_classes=(IsAuthenticated,)
             )
+    def favorite(self, request, pk):
+        return self.toggle_recipe(
+            request, pk, Favorite, 'favorites_count',
+            already_added='Рецепт уже добавлен в избранное',
+            not_added='Рецепта нет в избранном'
+        )
 
     @action(methods=['POST', 'DELETE'], detail=True,
             permission_classes=(IsAuthenticated,))
     def shopping_cart(self, request, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-        user = request.user
-        if request.method == 'POST':
-            cart, created = Cart.objects.get_or_create(
-                user=user, recipe=recipe)
-            if not created:
-                return Response(
-                    {'errors': 'Рецепт уже добавлен в корзину'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            serializer = MiniRecipeSerializer(recipe)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if request.method == 'DELETE':
-            cart = Cart.objects.filter(user=user, recipe=recipe)
-            if cart.exists():
-                cart.delete()
-                return Response(status.HTTP_204_NO_CONTENT)
-            return Response(
-                {'errors': 'Рецепта нет в корзине'},
-                status.HTTP_400_BAD_REQUEST
-            )
+        return self.toggle_recipe(
+            request, pk, Cart, 'cart_count',
+            already_added='Рецепт уже добавлен в корзину',
+            not_added='Рецепта нет в корзине'
+        )
+
+    @staticmethod
+    def shopping_list_job(user, digest):
+        """Фоновая задача для PDF большой корзины; None, если корзина
+        маленькая или задача упала и PDF нужно собрать в запросе"""
+        lines = IngredientRecipe.objects.shopping_list(user).count()
+        if lines < settings.SHOPPING_LIST_ASYNC_LINES:
+            return None
+        # Упавшую задачу не повторяем: PDF соберётся в запросе
+        job = enqueue('render_shopping_list', {'user_id': user.id},
+                      key=f'shopping_list:{user.id}:{digest}',
+                      retry_failed=False)
+        if job.status == Job.DONE and job.result is None:
+            job = requeue(job)
+        return None if job.status == Job.FAILED else job
 
     @action(methods=['get'], detail=False,
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(PDFRenderer, PlainTextRenderer, CSVRenderer,
+                              ShoppingListJSONRenderer))
     def download_shopping_cart(self, request):
-        ingredients = IngredientRecipe.objects.filter(
-            recipe__cart__user=request.user).values_list(
-            'ingredient__name', 'ingredient__measurement_unit', 'amount')
-        buy_list = dict()
-        for ingredient in ingredients:
-            if ingredient[0] not in buy_list:
-                buy_list[ingredient[0]] = {
-                    'measurement_unit': ingredient[1],
-                    'amount': ingredient[2]
-                }
-            else:
-                buy_list[ingredient[0]]['amount'] += ingredient[2]
-
-        pdfmetrics.registerFont(
-            TTFont(
-                'DejaVuSerif',
-                os.path.dirname(os.path.abspath(__file__))
-                + '/DejaVuSerif.ttf',
-                'UTF-8'
-            )
-        )
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, bottomup=0)
-        p.setFont('DejaVuSerif', 14)
-        p.drawString(100, 100, "Список покупок:")
-        p.setFont('DejaVuSerif', 12)
-        height = 115
-        width = 100
-        print(buy_list)
-        for name, data in buy_list.items():
-            p.drawString(
-                x=width,
-                y=height,
-                text=f'{name} ({data["measurement_unit"]}) - {data["amount"]}'
+        renderer = request.accepted_renderer
+        digest = shopping_list.cart_digest(request.user)
+        etag = quote_etag(f'{digest}-{renderer.format}')
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        content_type = f'{renderer.media_type}; charset={renderer.charset}'
+        ingredients = IngredientRecipe.objects.shopping_list(
+            request.user).iterator()
+        if renderer.format in shopping_list.STREAMING_RENDERERS:
+            response = StreamingHttpResponse(
+                shopping_list.STREAMING_RENDERERS[renderer.format](
+                    ingredients),
+                content_type=content_type
             )
-            height += 15
-        p.showPage()
-        p.save()
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True, filename='list.pdf')
+        else:
+            document = shopping_list.get_document(request.user, digest)
+            if document is None:
+                job = self.shopping_list_job(request.user, digest)
+                if job is not None and job.status != Job.DONE:
+                    return Response(
+                        {'status': job.status},
+                        status=status.HTTP_202_ACCEPTED,
+                        headers={'Retry-After': '2'}
+                    )
+                if job is not None:
+                    document = bytes(job.result)
+                    shopping_list.set_document(request.user, digest, document)
+            if document is None:
+                response = HttpResponse(content_type=renderer.media_type)
+                shopping_list.render_pdf(ingredients, response)
+                shopping_list.set_document(
+                    request.user, digest, response.content)
+            else:
+                response = HttpResponse(
+                    document, content_type=renderer.media_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="list.{renderer.format}"')
+        response['ETag'] = etag
+        return response
+
+
+class JobMetricsView(APIView):
+    """Глубина очереди фоновых задач и задержки их выполнения"""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(metrics())
+
+
+class RequestMetricsView(APIView):
+    """Запросы к БД, время и размер ответов по view этого процесса"""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(request_stats.snapshot())
+
+    def delete(self, request):
+        request_stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+DURATION_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p, count):
+        """Верхняя граница корзины, в которую попал p-й процентиль"""
+        rank = count * p / 100
+        seen = 0
+        for bound, bucket in zip(self.bounds, self.counts):
+            seen += bucket
+            if seen >= rank:
+                return min(bound, round(self.max, 2))
+        return round(self.max, 2)
+
+    def as_dict(self, count):
+        return {
+            'mean': round(self.total / count, 2) if count else 0,
+            'p50': self.percentile(50, count),
+            'p95': self.percentile(95, count),
+            'p99': self.percentile(99, count),
+            'max': round(self.max, 2),
+            'buckets': dict(zip(
+                [*map(str, self.bounds), 'inf'], self.counts)),
+        }
+
+
+class EndpointStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_time = Histogram(DURATION_BUCKETS)
+        self.app_time = Histogram(DURATION_BUCKETS)
+        self.serialize_time = Histogram(DURATION_BUCKETS)
+        self.size = 0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'duration_ms': self.duration.as_dict(self.count),
+            'queries': self.queries.as_dict(self.count),
+            'db_ms': self.db_time.as_dict(self.count),
+            'app_ms': self.app_time.as_dict(self.count),
+            'serialize_ms': self.serialize_time.as_dict(self.count),
+            'mean_size': self.size // self.count if self.count else 0,
+        }
+
+
+class RequestStats:
+    """Накопленные метрики по view и action в памяти процесса"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+            self.started = time.time()
+
+    def record(self, endpoint, status_code, timing, size):
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.count += 1
+            stats.errors += status_code >= 500
+            stats.duration.add(timing.total)
+            stats.queries.add(timing.queries)
+            stats.db_time.add(timing.db)
+            stats.app_time.add(timing.app)
+            stats.serialize_time.add(timing.serialize)
+            stats.size += size
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'uptime': round(time.time() - self.started),
+                'endpoints': {
+                    endpoint: stats.as_dict()
+                    for endpoint, stats in sorted(self.endpoints.items())
+                },
+            }
+
+
+request_stats = RequestStats()
+_current = threading.local()
+
+
+class Timing:
+    """Запросы к БД и время одного HTTP-запроса в миллисекундах"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += (time.perf_counter() - start) * 1000
+
+    @property
+    def app(self):
+        return max(self.total - self.db - self.serialize, 0.0)
+
+    def header(self):
+        return (f'db;dur={self.db:.1f};desc="{self.queries} queries", '
+                f'app;dur={self.app:.1f}, '
+                f'serialize;dur={self.serialize:.1f}, '
+                f'total;dur={self.total:.1f}')
+
+
+@contextmanager
+def serialize_timer():
+    """Время сериализации ответа в текущем запросе, вызывается из
+    рендерера"""
+    timing = getattr(_current, 'timing', None)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timing is not None:
+            timing.serialize += (time.perf_counter() - start) * 1000
+
+
+def endpoint_name(view_func, method):
+    """ViewSet.action для DRF, модуль.функция для остальных view"""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{cls.__name__}.{action}'
+
+
+class RequestMetricsMiddleware:
+    """Считает запросы к БД, время и размер ответа по каждому view.
+    Заголовок Server-Timing добавляется с DEBUG или SERVER_TIMING"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = _current.timing = Timing()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timing):
+                response = self.get_response(request)
+        finally:
+            _current.timing = None
+        timing.total = (time.perf_counter() - start) * 1000
+        if settings.DEBUG or settings.SERVER_TIMING:
+            response['Server-Timing'] = timing.header()
+        size = 0 if response.streaming else len(response.content)
+        request_stats.record(
+            getattr(request, '_endpoint', 'unresolved'),
+            response.status_code, timing, size
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._endpoint = endpoint_name(view_func, request.method)
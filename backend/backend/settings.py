@@ -42,12 +42,14 @@ INSTALLED_APPS = [
     'djoser',
     'colorfield',
     'corsheaders',
-    'api',
+    'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
     'recipes',
     'users',
 ]
 
 MIDDLEWARE = [
+    'backend.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -94,6 +96,38 @@ DATABASES = {
 }
 
 
+# Cache for rendered shopping lists. Invalidation has to reach every gunicorn
+# worker, so only a shared backend (e.g. FileBasedCache) is usable here.
+# Without one the cache is disabled and the cart digest is recomputed on
+# every request. A cart change deletes the user's digest and the document
+# built from it; TIMEOUT bounds anything missed by a concurrent write.
+# MAX_ENTRIES caps the number of entries, not their size, and the culling
+# is not LRU.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shopping_list': {
+        'BACKEND': os.getenv(
+            'SHOPPING_LIST_CACHE_BACKEND',
+            default='django.core.cache.backends.dummy.DummyCache'
+        ),
+        'LOCATION': os.getenv(
+            'SHOPPING_LIST_CACHE_LOCATION', default='shopping_list'
+        ),
+        'TIMEOUT': int(os.getenv(
+            'SHOPPING_LIST_CACHE_TIMEOUT', default=24 * 60 * 60
+        )),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv(
+                'SHOPPING_LIST_CACHE_MAX_ENTRIES', default=1000
+            )),
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -136,6 +170,26 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv(
+    'RECIPE_IMAGE_MAX_SIZE', default=2 * 1024 * 1024
+))
+
+JOBS_EAGER = os.getenv('JOBS_EAGER', default='false').lower() == 'true'
+
+SHOPPING_LIST_ASYNC_LINES = int(os.getenv(
+    'SHOPPING_LIST_ASYNC_LINES', default=300
+))
+
+FEED_FANOUT_MIN_FOLLOWS = int(os.getenv(
+    'FEED_FANOUT_MIN_FOLLOWS', default=0
+))
+
+SERVER_TIMING = os.getenv('SERVER_TIMING', default='false').lower() == 'true'
+
+SIMILARITY_DIR = os.getenv(
+    'SIMILARITY_DIR', default=os.path.join(BASE_DIR, 'similarity')
+)
+
 AUTH_USER_MODEL = 'users.User'
 
 DJOSER = {
@@ -160,6 +214,10 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
@@ -0,0 +1,21 @@
+from django.contrib import admin
+
+from .models import Job
+from .queue import requeue
+
+
+class JobModelAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'run_at',
+                    'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['idempotency_key']
+    exclude = ['result']
+    actions = ['requeue']
+
+    def requeue(self, request, queryset):
+        for job in queryset:
+            requeue(job)
+    requeue.short_description = 'Вернуть в очередь'
+
+
+admin.site.register(Job, JobModelAdmin)
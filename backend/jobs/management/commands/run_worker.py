@@ -0,0 +1,52 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from jobs.models import Job
+from jobs.queue import execute, purge
+
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = 'Runs background jobs from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit when the queue is empty')
+        parser.add_argument(
+            '--sleep', type=float, default=1.0,
+            help='Seconds to wait when the queue is empty')
+        parser.add_argument(
+            '--lease', type=int, default=300,
+            help='Seconds after which a running job is taken again')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        done = failed = 0
+        purged_at = 0
+        while not self.stopping:
+            if time.monotonic() - purged_at > PURGE_INTERVAL:
+                purge()
+                purged_at = time.monotonic()
+            close_old_connections()
+            job = Job.objects.claim(options['lease'])
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            job = execute(job)
+            if job.status == Job.DONE:
+                done += 1
+            else:
+                failed += 1
+                self.stderr.write(f'{job}: attempt {job.attempts} failed')
+        self.stdout.write(f'{done} job(s) done, {failed} attempt(s) failed')
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+
+class JobQuerySet(models.QuerySet):
+    def due(self, lease):
+        """Задачи, которые пора выполнить, и зависшие дольше lease секунд"""
+        now = timezone.now()
+        return self.filter(
+            Q(status=Job.PENDING, run_at__lte=now)
+            | Q(status=Job.RUNNING,
+                started_at__lt=now - timedelta(seconds=lease))
+        )
+
+    def claim(self, lease):
+        """Забирает одну задачу из очереди, не мешая другим воркерам"""
+        with transaction.atomic():
+            job = self.due(lease).select_for_update(
+                skip_locked=True
+            ).order_by('run_at', 'id').first()
+            if job is None:
+                return None
+            job.status = Job.RUNNING
+            job.attempts += 1
+            job.started_at = timezone.now()
+            job.save(update_fields=['status', 'attempts', 'started_at'])
+        return job
+
+
+class Job(models.Model):
+    """Модель для фоновых задач"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=100)
+    payload = models.TextField('Параметры', default='{}')
+    idempotency_key = models.CharField(
+        'Ключ идемпотентности', max_length=255,
+        unique=True, null=True, blank=True
+    )
+    status = models.CharField(
+        'Статус', max_length=10, choices=STATUSES, default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Максимум попыток', default=5
+    )
+    run_at = models.DateTimeField('Запустить после', default=timezone.now)
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+    started_at = models.DateTimeField('Начата', null=True, blank=True)
+    finished_at = models.DateTimeField('Завершена', null=True, blank=True)
+    result = models.BinaryField('Результат', null=True, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at'], name='job_status_run_at_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.id} ({self.status})'
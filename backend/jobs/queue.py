@@ -0,0 +1,155 @@
+import json
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 5
+BACKOFF_MAX = 3600
+RETENTION = timedelta(days=7)
+METRICS_WINDOW = timedelta(hours=1)
+METRICS_SAMPLE = 1000
+
+tasks = {}
+
+
+def task(name):
+    """Регистрирует функцию как фоновую задачу с именем name"""
+    def register(func):
+        tasks[name] = func
+        return func
+    return register
+
+
+def backoff(attempts):
+    """Экспоненциальная задержка перед повтором со случайной добавкой"""
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return timedelta(seconds=delay + random.uniform(0, delay / 2))
+
+
+def enqueue(name, payload=None, key=None, max_attempts=5, retry_failed=True):
+    """Ставит задачу в очередь. Повторный вызов с тем же key возвращает
+    уже созданную задачу, а упавшую с retry_failed возвращает в очередь.
+    Строка появится для воркера после коммита"""
+    if name not in tasks:
+        raise ValueError(f'Неизвестная задача: {name}')
+    fields = {
+        'name': name,
+        'payload': json.dumps(payload or {}),
+        'max_attempts': max_attempts,
+    }
+    if key is None:
+        job = Job.objects.create(**fields)
+    else:
+        job, _ = Job.objects.get_or_create(
+            idempotency_key=key, defaults=fields)
+        if retry_failed and job.status == Job.FAILED:
+            return requeue(job)
+    if settings.JOBS_EAGER and job.status == Job.PENDING:
+        transaction.on_commit(lambda: run_now(job.id))
+    return job
+
+
+def requeue(job):
+    """Возвращает выполненную или упавшую задачу в очередь"""
+    job.status = Job.PENDING
+    job.attempts = 0
+    job.run_at = timezone.now()
+    job.result = None
+    job.error = ''
+    job.save(update_fields=['status', 'attempts', 'run_at', 'result',
+                            'error'])
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: run_now(job.id))
+    return job
+
+
+def run_now(job_id):
+    job = Job.objects.filter(id=job_id, status=Job.PENDING).first()
+    if job is not None:
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'attempts', 'started_at'])
+        execute(job)
+
+
+def execute(job):
+    """Выполняет взятую задачу, при ошибке планирует повтор"""
+    try:
+        result = tasks[job.name](**json.loads(job.payload))
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.PENDING
+            job.run_at = timezone.now() + backoff(job.attempts)
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+        logger.warning('Задача %s #%s упала (попытка %s)', job.name, job.id,
+                       job.attempts, exc_info=True)
+    else:
+        job.status = Job.DONE
+        job.result = result
+        job.error = ''
+        job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'run_at', 'result', 'error',
+                            'finished_at'])
+    return job
+
+
+def purge():
+    """Удаляет выполненные задачи старше RETENTION"""
+    deleted, _ = Job.objects.filter(
+        status=Job.DONE, finished_at__lt=timezone.now() - RETENTION
+    ).delete()
+    return deleted
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        f'p{p}': round(values[min(len(values) - 1,
+                                  len(values) * p // 100)], 3)
+        for p in (50, 95, 99)
+    }
+
+
+def metrics():
+    """Глубина очереди по задачам и задержки за последний час"""
+    now = timezone.now()
+    statuses = {}
+    for row in Job.objects.order_by().values('name', 'status').annotate(
+            total=Count('id')):
+        statuses.setdefault(row['name'], {})[row['status']] = row['total']
+    due = Job.objects.filter(status=Job.PENDING, run_at__lte=now)
+    oldest = due.aggregate(oldest=Min('run_at'))['oldest']
+    finished = Job.objects.filter(
+        status=Job.DONE, finished_at__gte=now - METRICS_WINDOW
+    ).order_by('-finished_at').values_list(
+        'run_at', 'started_at', 'finished_at')[:METRICS_SAMPLE]
+    waits, runs = [], []
+    for run_at, started_at, finished_at in finished:
+        waits.append((started_at - run_at).total_seconds())
+        runs.append((finished_at - started_at).total_seconds())
+    return {
+        'depth': due.count(),
+        'scheduled': Job.objects.filter(
+            status=Job.PENDING, run_at__gt=now).count(),
+        'oldest_age': (now - oldest).total_seconds() if oldest else 0,
+        'tasks': statuses,
+        'wait': _percentiles(waits),
+        'run_time': _percentiles(runs),
+        'done_last_hour': len(runs),
+    }
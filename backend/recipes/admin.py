@@ -8,14 +8,11 @@ class IngredientInline(admin.TabularInline):
 
 
 class RecipeModelAdmin(admin.ModelAdmin):
-    list_display = ['name', 'author', 'get_favorite_count']
+    list_display = ['name', 'author', 'favorites_count']
     list_filter = ['name', 'author', 'tags']
+    list_select_related = ['author']
     inlines = (IngredientInline,)
 
-    @staticmethod
-    def get_favorite_count(obj):
-        return obj.favorites.count()
-
 
 class IngredientModelAdmin(admin.ModelAdmin):
     list_display = ['name', 'measurement_unit']
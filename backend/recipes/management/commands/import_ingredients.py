@@ -1,23 +1,80 @@
 import csv
+import json
+import os
+import re
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 from recipes.models import Ingredient
 
+READ_SIZE = 64 * 1024
+SEPARATOR = re.compile(r'[\s,]*')
+
+
+def read_csv(file):
+    for row in csv.reader(file, delimiter=','):
+        if row:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    """Разбирает JSON-массив объектов по одному, не загружая файл целиком"""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив ингредиентов')
+    position = 1
+    while True:
+        position = SEPARATOR.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError('Файл JSON оборван')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item['name'], item['measurement_unit']
+
 
 class Command(BaseCommand):
-    help = "Loads data from data/ingredients.csv"
+    help = 'Loads ingredients from a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv')
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--quiet', action='store_true')
 
     def handle(self, *args, **options):
-        print("====== Loading data... =====")
-        with open('data/ingredients.csv', newline='') as csvfile:
-            data = csv.reader(csvfile, delimiter=',')
-            for row in data:
-                category, created = Ingredient.objects.get_or_create(
-                    name=row[0],
-                    measurement_unit=row[1]
-                )
-                if created:
-                    print(f'Ingredient {category.name} created')
-                else:
-                    print(f'Ingredient {category.name} exists.')
-        print('===== Ingredients uploaded =====')
+        path = options['path']
+        batch_size = options['batch_size']
+        reader = read_json if path.endswith('.json') else read_csv
+        total = created = 0
+        with open(path, newline='', encoding='utf-8') as file:
+            rows = reader(file)
+            while True:
+                chunk = set(islice(rows, batch_size))
+                if not chunk:
+                    break
+                total += len(chunk)
+                existing = set(Ingredient.objects.filter(
+                    name__in={name for name, _ in chunk}
+                ).values_list('name', 'measurement_unit'))
+                new = [
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in chunk - existing
+                ]
+                Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+                created += len(new)
+        if not options['quiet']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Ingredients: {total} read, {created} created, '
+                f'{total - created} already existed'
+            ))
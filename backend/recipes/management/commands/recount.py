@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Cart, Favorite, Recipe
+from users.models import Follow, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'cart_count', Cart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'following'),
+)
+
+
+def actual_count(related_model, field):
+    return Coalesce(Subquery(
+        related_model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Recalculates denormalized favorite, cart and follower counters'
+
+    def handle(self, *args, **options):
+        for model, counter, related_model, field in COUNTERS:
+            with transaction.atomic():
+                drift = model.objects.annotate(
+                    actual=actual_count(related_model, field)
+                ).exclude(**{counter: F('actual')}).count()
+                if drift:
+                    model.objects.update(
+                        **{counter: actual_count(related_model, field)})
+            self.stdout.write(
+                f'{model.__name__}.{counter}: {drift} row(s) fixed')
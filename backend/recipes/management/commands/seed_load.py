@@ -0,0 +1,196 @@
+import random
+import time
+from io import BytesIO
+from itertools import accumulate, islice
+
+from api.images import make_thumbnails
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+from recipes.models import (Cart, Favorite, Ingredient, IngredientRecipe,
+                            Recipe, Tag)
+from rest_framework.authtoken.models import Token
+from users.models import Follow, User
+
+CHUNK_SIZE = 5000
+IMAGE_NAME = 'recipes/images/seed_load.jpg'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+
+
+def power_law(count, exponent, rng):
+    """Накопленные веса 1 / rank^exponent для случайно перемешанных
+    позиций: немногие получают большую часть выборок"""
+    weights = [1 / (rank + 1) ** exponent for rank in range(count)]
+    rng.shuffle(weights)
+    return list(accumulate(weights))
+
+
+def pick(population, cum_weights, count, rng):
+    """До count разных элементов с учётом весов"""
+    count = min(count, len(population))
+    chosen = set()
+    for _ in range(4):
+        chosen.update(rng.choices(
+            population, cum_weights=cum_weights, k=count - len(chosen)))
+        if len(chosen) >= count:
+            break
+    return chosen
+
+
+def bulk_create(model, objects):
+    """bulk_create порциями, чтобы не держать в памяти все объекты"""
+    objects = iter(objects)
+    total = 0
+    while True:
+        chunk = list(islice(objects, CHUNK_SIZE))
+        if not chunk:
+            return total
+        model.objects.bulk_create(chunk, ignore_conflicts=True)
+        total += len(chunk)
+
+
+class Command(BaseCommand):
+    help = ('Generates users, power-law follow graph, recipes, favorites '
+            'and carts for load testing')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя')
+        parser.add_argument(
+            '--favorites', type=int, default=15,
+            help='Среднее число рецептов в избранном')
+        parser.add_argument(
+            '--cart', type=int, default=5,
+            help='Среднее число рецептов в корзине')
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного распределения популярности')
+        parser.add_argument('--prefix', default='load')
+        parser.add_argument('--password', default='load-test-password')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть, '
+                f'укажите другой --prefix')
+        self.rng = random.Random(options['seed'])
+        self.exponent = options['exponent']
+        start = time.monotonic()
+        if not Ingredient.objects.exists():
+            call_command('import_ingredients', quiet=True)
+        tags = self.create_tags()
+        users = self.create_users(
+            prefix, options['users'], options['password'])
+        self.create_follows(users, options['follows'])
+        recipes = self.create_recipes(
+            prefix, users, tags, options['recipes'])
+        self.create_marks(Favorite, users, recipes, options['favorites'])
+        self.create_marks(Cart, users, recipes, options['cart'])
+        call_command('recount', stdout=self.stdout)
+        call_command('update_search_index', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Done in {time.monotonic() - start:.1f}s'))
+
+    def report(self, name, count):
+        self.stdout.write(f'{name}: {count}')
+
+    def create_tags(self):
+        Tag.objects.bulk_create(
+            [Tag(name=name, color=color, slug=slug)
+             for name, color, slug in TAGS],
+            ignore_conflicts=True
+        )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, prefix, count, password):
+        password = make_password(password)
+        bulk_create(User, (
+            User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com',
+                 first_name='Нагрузка', last_name=str(i), password=password)
+            for i in range(count)
+        ))
+        users = list(User.objects.filter(
+            username__startswith=prefix).values_list('id', flat=True))
+        bulk_create(Token, (
+            Token(user_id=user, key=Token.generate_key()) for user in users))
+        self.report('users', len(users))
+        return users
+
+    def create_follows(self, users, average):
+        """Подписки на популярных авторов: степенное распределение и
+        по числу подписчиков, и по числу подписок"""
+        popularity = power_law(len(users), self.exponent, self.rng)
+        degrees = [
+            min(len(users) - 1, int(self.rng.paretovariate(2) * average / 2))
+            for _ in users
+        ]
+        total = bulk_create(Follow, (
+            Follow(user_id=follower, following_id=following)
+            for follower, degree in zip(users, degrees)
+            for following in pick(users, popularity, degree, self.rng)
+            if following != follower
+        ))
+        self.report('follows', total)
+
+    def create_recipes(self, prefix, authors, tags, count):
+        storage = Recipe._meta.get_field('image').storage
+        if not storage.exists(IMAGE_NAME):
+            content = BytesIO()
+            Image.new('RGB', (960, 640), '#E26C2D').save(content, 'JPEG')
+            storage.save(IMAGE_NAME, ContentFile(content.getvalue()))
+        make_thumbnails(IMAGE_NAME, storage)
+
+        productivity = power_law(len(authors), self.exponent, self.rng)
+        recipe_authors = self.rng.choices(
+            authors, cum_weights=productivity, k=count)
+        bulk_create(Recipe, (
+            Recipe(author_id=author, name=f'Рецепт {i}', image=IMAGE_NAME,
+                   thumbnails_ready=True,
+                   text='Сгенерировано для нагрузочного теста',
+                   cooking_time=self.rng.randint(5, 180))
+            for i, author in enumerate(recipe_authors)
+        ))
+        recipes = list(Recipe.objects.filter(
+            author__username__startswith=prefix).values_list('id', flat=True))
+
+        bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe, tag_id=tag)
+            for recipe in recipes
+            for tag in self.rng.sample(tags, self.rng.randint(1, len(tags)))
+        ))
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        usage = power_law(len(ingredients), self.exponent, self.rng)
+        total = bulk_create(IngredientRecipe, (
+            IngredientRecipe(recipe_id=recipe, ingredient_id=ingredient,
+                             amount=self.rng.randint(1, 500))
+            for recipe in recipes
+            for ingredient in pick(
+                ingredients, usage,
+                max(2, min(25, round(self.rng.gauss(9, 3)))), self.rng)
+        ))
+        self.report('recipes', len(recipes))
+        self.report('recipe ingredients', total)
+        return recipes
+
+    def create_marks(self, model, users, recipes, average):
+        """Избранное или корзина: популярные рецепты встречаются чаще"""
+        popularity = power_law(len(recipes), self.exponent, self.rng)
+        total = bulk_create(model, (
+            model(user_id=user, recipe_id=recipe)
+            for user in users
+            for recipe in pick(
+                recipes, popularity,
+                int(self.rng.expovariate(1 / average)), self.rng)
+        ))
+        self.report(model.__name__.lower(), total)
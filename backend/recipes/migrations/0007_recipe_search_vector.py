@@ -0,0 +1,88 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:45
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+INGREDIENT_NAMES = """(
+    SELECT {aggregate}
+    FROM recipes_ingredientrecipe AS item
+    JOIN recipes_ingredient AS ingredient
+        ON ingredient.id = item.ingredient_id
+    WHERE item.recipe_id = recipe.id
+)"""
+
+
+def fold(sql):
+    return f"replace(replace({sql}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+            'USING gin (search_vector)'
+        )
+        schema_editor.execute(
+            "UPDATE recipes_recipe AS recipe SET search_vector = "
+            "setweight(to_tsvector('russian', recipe.name), 'A') || "
+            "setweight(to_tsvector('russian', recipe.text), 'B') || "
+            "setweight(to_tsvector('russian', coalesce({}, '')), 'C')".format(
+                INGREDIENT_NAMES.format(
+                    aggregate="string_agg(ingredient.name, ' ')"))
+        )
+    elif schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5('
+            'name, text, ingredients, tokenize="unicode61")'
+        )
+        # Веса полей для bm25 в скрытом столбце rank
+        schema_editor.execute(
+            'INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rank) '
+            "VALUES ('rank', 'bm25(10.0, 3.0, 1.0)')"
+        )
+        schema_editor.execute(
+            'INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients) '
+            'SELECT recipe.id, {}, {}, {} FROM recipes_recipe AS recipe'.format(
+                fold('recipe.name'), fold('recipe.text'),
+                fold(INGREDIENT_NAMES.format(
+                    aggregate="group_concat(ingredient.name, ' ')")))
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+    elif schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS recipes_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='RecipeSearch',
+            fields=[
+                ('recipe', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='recipes.Recipe')),
+                ('name', models.TextField()),
+                ('text', models.TextField()),
+                ('ingredients', models.TextField()),
+                ('document', models.TextField(db_column='recipes_recipe_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'recipes_recipe_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_thumbnails_ready'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='ingredient_name_pattern_idx',
+        ),
+    ]
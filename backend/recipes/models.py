@@ -1,7 +1,11 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
-from users.models import User
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch,
+                              Subquery, Sum, Value)
+from django.db.models.functions import Coalesce
+from users.models import DerivedFieldsMixin, Follow, User
 
 
 class Tag(models.Model):
@@ -44,9 +48,61 @@ class RecipeQuerySet(models.QuerySet):
             return self.filter(cart__user=user, id=id)
         return self.filter(cart__user=user)
 
+    def with_user_flags(self, user):
+        """Аннотирует флаги избранного, корзины и подписки на автора"""
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                author_is_subscribed=false
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(Cart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user, following=OuterRef('author')))
+        )
+
+    def latest_by_authors(self, authors, limit=None):
+        """Последние рецепты авторов, не больше limit на каждого"""
+        if not authors:
+            return self.none()
+        queryset = self.filter(author__in=authors)
+        if limit is None:
+            return queryset
+        if limit < 1:
+            return self.none()
+        # id limit-го по новизне рецепта того же автора; у авторов с
+        # меньшим числом рецептов подзапрос пуст и берутся все
+        threshold = Subquery(
+            Recipe.objects.filter(author=OuterRef('author')).order_by(
+                '-id').values('id')[limit - 1:limit]
+        )
+        return queryset.filter(
+            id__gte=Coalesce(threshold, 0)).order_by('-id')
+
+    def for_user(self, user):
+        """Рецепты со всеми связанными данными для RecipeSerializer"""
+        return self.select_related('author').defer(
+            'search_vector'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientrecipe_set',
+                queryset=IngredientRecipe.objects.select_related(
+                    'ingredient')
+            )
+        ).with_user_flags(user)
+
 
-class Recipe(models.Model):
+class Recipe(DerivedFieldsMixin, models.Model):
     """Модель для рецептов"""
+    derived_fields = (
+        'favorites_count', 'cart_count', 'thumbnails_ready', 'search_vector'
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -72,6 +128,16 @@ class Recipe(models.Model):
                 message='Время должно быть больше нуля'
             )]
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    cart_count = models.PositiveIntegerField(
+        'В корзинах', default=0, editable=False
+    )
+    thumbnails_ready = models.BooleanField(
+        'Миниатюры готовы', default=False, editable=False
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
 
     objects = RecipeQuerySet.as_manager()
 
@@ -79,11 +145,52 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_popularity_idx'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeSearch(models.Model):
+    """Виртуальная таблица FTS5 для поиска рецептов на SQLite.
+
+    Заполняется api.search.update_search_index. На PostgreSQL таблицы
+    нет, там ищут по Recipe.search_vector.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_document'
+    )
+    name = models.TextField()
+    text = models.TextField()
+    ingredients = models.TextField()
+    # Скрытый столбец с именем таблицы: document=запрос равносильно MATCH
+    document = models.TextField(db_column='recipes_recipe_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'recipes_recipe_fts'
+
+
+class IngredientRecipeQuerySet(models.QuerySet):
+    def shopping_list(self, user):
+        """Суммы ингредиентов из корзины пользователя по названию и единице"""
+        return self.filter(recipe__cart__user=user).values(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).annotate(
+            total=Sum('amount')
+        ).order_by('ingredient__name', 'ingredient__measurement_unit')
+
+
 class IngredientRecipe(models.Model):
     """Модель для связи ингредиентов и рецептов"""
     ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
@@ -96,6 +203,8 @@ class IngredientRecipe(models.Model):
             )]
     )
 
+    objects = IngredientRecipeQuerySet.as_manager()
+
     class Meta:
         ordering = ['id']
         constraints = [
@@ -128,6 +237,12 @@ class Favorite(models.Model):
                 name='unique_favorites-recipe'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe'],
+                name='favorite_user_recipe_idx'
+            )
+        ]
 
 
 class Cart(models.Model):
@@ -149,3 +264,33 @@ class Cart(models.Model):
                 name='unique_cart-recipe'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe'],
+                name='cart_user_recipe_idx'
+            )
+        ]
+
+
+class FeedEntry(models.Model):
+    """Рецепт в материализованной ленте подписчика (fan-out on write)"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed-recipe'
+            )
+        ]
@@ -59,7 +59,7 @@ class UserModelAdmin(UserAdmin):
     form = UserChangeForm
     add_form = UserCreationForm
 
-    list_display = ('email', 'username')
+    list_display = ('email', 'username', 'recipes_count', 'followers_count')
     list_filter = ('is_superuser', 'is_staff', 'is_active')
     fieldsets = (('Personal info', {
         'fields': ('email', 'username', 'first_name', 'last_name',
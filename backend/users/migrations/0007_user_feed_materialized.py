@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='feed_materialized',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Лента собрана'),
+        ),
+    ]
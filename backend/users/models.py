@@ -1,13 +1,49 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import BooleanField, F, Value
+from django.db.models.functions import Greatest
 
 
-class User(AbstractUser):
+def decremented(counter):
+    """counter - 1, но не меньше нуля: строки, добавленные в админке,
+    счётчик не увеличивали"""
+    return Greatest(F(counter) - 1, 0)
+
+
+class DerivedFieldsMixin:
+    """Поля derived_fields пишут только F()-обновления, задачи и
+    recount. Сохранение уже существующей строки без update_fields их не
+    трогает, иначе вернуло бы значения на момент загрузки объекта"""
+    derived_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.derived_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(DerivedFieldsMixin, AbstractUser):
     """Кастомная модель пользователя."""
+    derived_fields = ('recipes_count', 'followers_count', 'feed_materialized')
     email = models.EmailField(max_length=254, blank=False)
     first_name = models.CharField(max_length=150, blank=False)
     last_name = models.CharField(max_length=150, blank=False)
     is_subscribed = models.BooleanField(blank=False, default=False)
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False
+    )
+    feed_materialized = models.BooleanField(
+        'Лента собрана', default=False, editable=False
+    )
 
     REQUIRED_FIELDS = ['email', 'first_name', 'last_name']
 
@@ -17,6 +53,14 @@ class User(AbstractUser):
         ordering = ['id']
 
 
+class FollowQuerySet(models.QuerySet):
+    def with_following(self):
+        """Подписки с автором и флагом подписки"""
+        return self.select_related('following').annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        )
+
+
 class Follow(models.Model):
     """Модель для хранения подписок пользователей"""
     user = models.ForeignKey(
@@ -30,6 +74,8 @@ class Follow(models.Model):
         related_name='following',
     )
 
+    objects = FollowQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
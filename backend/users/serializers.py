@@ -22,6 +22,8 @@ class CustomUserSerializer(UserSerializer):
         return user
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -1,22 +1,38 @@
+from collections import defaultdict
+
+from api import feeds
 from api.pagination import CustomPageNumberPagination
 from api.serializers import FollowSerializer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
+from recipes.models import Recipe
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from .models import Follow, User
+from .models import Follow, User, decremented
 
 
 class CustomUserViewSet(UserViewSet):
     pagination_class = CustomPageNumberPagination
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.action not in ('list', 'retrieve') or user.is_anonymous:
+            return queryset
+        return queryset.annotate(subscribed=Exists(
+            Follow.objects.filter(user=user, following=OuterRef('pk'))
+        ))
+
     @action(methods=['POST', 'DELETE'], detail=True,
             permission_classes=(IsAuthenticated,))
+    @transaction.atomic
     def subscribe(self, request, id):
-        print(id)
         user = request.user
         following = get_object_or_404(User, id=id)
 
@@ -28,12 +44,20 @@ class CustomUserViewSet(UserViewSet):
                     {'errors': 'Автор уже добавлен в подписки'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            User.objects.filter(pk=following.pk).update(
+                followers_count=F('followers_count') + 1)
             serializer = FollowSerializer(follow, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            follow = Follow.objects.filter(user=user, following=following)
-            if follow.exists():
-                follow.delete()
+            deleted, _ = Follow.objects.filter(
+                user=user, following=following).delete()
+            if deleted:
+                User.objects.filter(pk=following.pk).update(
+                    followers_count=decremented('followers_count'))
+                # Не сигналом post_delete: с ним Follow удалялся бы
+                # через лишний SELECT
+                if settings.FEED_FANOUT_MIN_FOLLOWS:
+                    feeds.remove_author(user.id, following.id)
                 return Response(status.HTTP_204_NO_CONTENT)
             return Response(
                 {'errors': 'Автора нет в подписках'},
@@ -44,11 +68,19 @@ class CustomUserViewSet(UserViewSet):
             permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
         user = request.user
-        queryset = Follow.objects.filter(user=user)
+        queryset = Follow.objects.filter(
+            user=user).with_following().order_by('id')
         paginate = self.paginate_queryset(queryset)
+        recipes_limit = request.GET.get('recipes_limit')
+        recipes = defaultdict(list)
+        for recipe in Recipe.objects.latest_by_authors(
+            [follow.following_id for follow in paginate],
+            int(recipes_limit) if recipes_limit else None
+        ):
+            recipes[recipe.author_id].append(recipe)
         serializer = FollowSerializer(
             paginate,
             many=True,
-            context={'request': request}
+            context={'request': request, 'recipes': recipes}
         )
         return self.get_paginated_response(serializer.data)